@@ -1,9 +1,19 @@
 #!/usr/bin/env python3
+import bisect
+import contextlib
+import marshal
+import os
 import sys
 import unicodedata
+from array import array
+from collections import defaultdict
+from pathlib import Path
 
 START, END = ord(' '), sys.maxunicode + 1           # <1>
 
+TABLE_DIR = Path(os.environ.get('CF_TABLE_DIR', Path(__file__).parent))
+TABLE_FORMAT = 1
+
 def find(*query_words, start=START, end=END):       # <2>
     query = {w.upper() for w in query_words}        # <3>
     for code in range(start, end):
@@ -12,9 +22,166 @@ def find(*query_words, start=START, end=END):       # <2>
         if name and query.issubset(name.split()):   # <6>
             print(f'U+{code:04X}\t{char}\t{name}')  # <7>
 
+
+class NameTable:
+    """Names of all characters in one string, one name per line, with
+    arrays of their code points and of the offsets where they start.
+    The optional word index has the sorted words in the names, and for
+    each word, the rows of the names where it appears: the rows for
+    words[i] are postings[posting_ends[i - 1]:posting_ends[i]]."""
+
+    def __init__(self, codes, offsets, names):
+        self.codes = codes
+        self.offsets = offsets  # one more than codes: the end of names
+        self.names = names
+        self.words = None
+        self.posting_ends = array('I')
+        self.postings = array('I')
+
+    @classmethod
+    def build(cls, start=START, end=END):
+        codes = array('I')
+        lines = []
+        for code in range(start, end):
+            if name := unicodedata.name(chr(code), None):
+                codes.append(code)
+                lines.append(name + '\n')
+        offsets = array('I', [0])
+        for line in lines:
+            offsets.append(offsets[-1] + len(line))
+        return cls(codes, offsets, ''.join(lines))
+
+    def build_words(self):
+        rows = defaultdict(list)
+        for row in range(len(self.codes)):
+            for word in set(self.name(row).split()):
+                rows[word].append(row)
+        self.words = sorted(rows)
+        for word in self.words:
+            self.postings.extend(rows[word])
+            self.posting_ends.append(len(self.postings))
+
+    def name(self, row):
+        return self.names[self.offsets[row]:self.offsets[row + 1] - 1]
+
+    def rows(self, query):
+        "Yield the rows of the names with all the words in query, in order."
+        if not query:
+            yield from range(len(self.codes))
+        elif '' in query:
+            return  # no name has an empty word
+        elif self.words is not None:
+            yield from self.indexed_rows(query)
+        else:
+            yield from self.scanned_rows(query)
+
+    def word_rows(self, word):
+        i = bisect.bisect_left(self.words, word)
+        if i == len(self.words) or self.words[i] != word:
+            return self.postings[0:0]
+        start = self.posting_ends[i - 1] if i else 0
+        return self.postings[start:self.posting_ends[i]]
+
+    def indexed_rows(self, query):
+        postings = sorted((self.word_rows(word) for word in query), key=len)
+        found = set(postings[0]).intersection(*postings[1:])
+        yield from sorted(found)
+
+    def scanned_rows(self, query):
+        word = max(query, key=len)  # the longest word has fewer false hits
+        pos = self.names.find(word)
+        while pos != -1:
+            row = bisect.bisect_right(self.offsets, pos) - 1
+            if query.issubset(self.name(row).split()):
+                yield row
+            pos = self.names.find(word, self.offsets[row + 1])
+
+    def save(self, path, words_path=None):
+        data = (TABLE_FORMAT, unicodedata.unidata_version,
+                self.codes.tobytes(), self.offsets.tobytes(), self.names)
+        write_atomically(path, data)
+        if words_path is not None and self.words is not None:
+            data = (TABLE_FORMAT, unicodedata.unidata_version,
+                    '\n'.join(self.words), self.posting_ends.tobytes(),
+                    self.postings.tobytes())
+            write_atomically(words_path, data)
+
+    @classmethod
+    def load(cls, path):
+        """Read a table saved for this Unicode version;
+        raise ValueError for any other table."""
+        with open(path, 'rb') as fp:
+            table_format, version, codes, offsets, names = marshal.load(fp)
+        if (table_format, version) != (TABLE_FORMAT, unicodedata.unidata_version):
+            raise ValueError(f'{path} was saved by another version')
+        table = cls(array('I'), array('I'), names)
+        table.codes.frombytes(codes)
+        table.offsets.frombytes(offsets)
+        return table
+
+    def load_words(self, words_path):
+        with open(words_path, 'rb') as fp:
+            table_format, version, words, ends, postings = marshal.load(fp)
+        if (table_format, version) != (TABLE_FORMAT, unicodedata.unidata_version):
+            raise ValueError(f'{words_path} was saved by another version')
+        posting_ends, rows = array('I'), array('I')
+        posting_ends.frombytes(ends)
+        rows.frombytes(postings)
+        self.words = words.split('\n')
+        self.posting_ends, self.postings = posting_ends, rows
+
+
+def write_atomically(path, data):
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(temp_path, 'wb') as fp:
+            marshal.dump(data, fp)
+        os.replace(temp_path, path)  # readers never see a partial file
+    except OSError:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+
+def table_paths(directory=TABLE_DIR):
+    stem = f'cf-{unicodedata.unidata_version}'
+    return Path(directory) / f'{stem}.names', Path(directory) / f'{stem}.words'
+
+def load_table(directory=TABLE_DIR):
+    "Load the saved name table, saving it first if needed."
+    path, words_path = table_paths(directory)
+    try:
+        table = NameTable.load(path)
+    except (OSError, EOFError, ValueError, TypeError):
+        table = NameTable.build()
+        with contextlib.suppress(OSError):  # search it anyway if not saved
+            table.save(path)
+    if os.path.exists(words_path):
+        try:
+            table.load_words(words_path)
+        except (OSError, EOFError, ValueError, TypeError):
+            with contextlib.suppress(OSError):
+                os.remove(words_path)  # search without it until --index is run
+    return table
+
+def save_word_index(directory=TABLE_DIR):
+    table = NameTable.build()
+    table.build_words()
+    table.save(*table_paths(directory))
+
+def lookup(*query_words, start=START, end=END, directory=TABLE_DIR):
+    "Same output as find, from the saved name table."
+    query = {w.upper() for w in query_words}
+    table = load_table(directory)
+    for row in table.rows(query):
+        code = table.codes[row]
+        if start <= code < end:
+            print(f'U+{code:04X}\t{chr(code)}\t{table.name(row)}')
+
 def main(words):
-    if words:
-        find(*words)
+    if words == ['--index']:
+        save_word_index()
+    elif words:
+        lookup(*words)
     else:
         print('Please provide words to find.')
 
@@ -10,11 +10,18 @@
 ################ Imports and Types
 
 # tag::IMPORTS[]
+import functools
+import hashlib
+import io
+import marshal
 import math
 import operator as op
-from collections import ChainMap
+import os
+import sys
+from collections import ChainMap, OrderedDict
+from collections.abc import Callable, Iterable, Iterator
 from itertools import chain
-from typing import Any, TypeAlias, NoReturn
+from typing import Any, NamedTuple, TextIO, TypeAlias, NoReturn
 
 Symbol: TypeAlias = str
 Atom: TypeAlias = float | int | Symbol
@@ -26,28 +33,38 @@ Expression: TypeAlias = Atom | list
 
 def parse(program: str) -> Expression:
     "Read a Scheme expression from a string."
-    return read_from_tokens(tokenize(program))
+    return read_from_tokens(iter(tokenize(program)))
 
 def tokenize(s: str) -> list[str]:
     "Convert a string into a list of tokens."
     return s.replace('(', ' ( ').replace(')', ' ) ').split()
 
-def read_from_tokens(tokens: list[str]) -> Expression:
-    "Read an expression from a sequence of tokens."
-    if len(tokens) == 0:
-        raise SyntaxError('unexpected EOF while reading')
-    token = tokens.pop(0)
+def read_from_tokens(tokens: Iterator[str]) -> Expression:
+    "Read an expression from an iterator of tokens."
+    for token in tokens:
+        return read_expression(token, tokens)
+    raise SyntaxError('unexpected EOF while reading')
+
+def read_expression(token: str, tokens: Iterator[str]) -> Expression:
+    "Read an expression starting with token, consuming the rest from tokens."
     if '(' == token:
         exp = []
-        while tokens[0] != ')':
-            exp.append(read_from_tokens(tokens))
-        tokens.pop(0)  # discard ')'
-        return exp
+        for token in tokens:
+            if ')' == token:
+                return exp
+            exp.append(read_expression(token, tokens))
+        raise SyntaxError('unexpected EOF while reading')
     elif ')' == token:
         raise SyntaxError('unexpected )')
     else:
         return parse_atom(token)
 
+def read_forms(lines: Iterable[str]) -> Iterator[Expression]:
+    "Lazily read top-level expressions from lines of source code."
+    tokens = chain.from_iterable(map(tokenize, lines))
+    for token in tokens:
+        yield read_expression(token, tokens)
+
 def parse_atom(token: str) -> Atom:
     "Numbers become numbers; every other token is a symbol."
     try:
@@ -105,6 +122,7 @@ def standard_env() -> Environment:
             'list?': lambda x: isinstance(x, list),
             'map': lambda *args: list(map(*args)),
             'max': max,
+            'memo-info': lambda proc: list(proc.cache_info()),
             'min': min,
             'not': op.not_,
             'null?': lambda x: x == [],
@@ -119,12 +137,13 @@ def standard_env() -> Environment:
 ################ Interaction: A REPL
 
 # tag::REPL[]
-def repl(prompt: str = 'lis.py> ') -> NoReturn:
+def repl(prompt: str = 'lis.py> ', engine: str = 'compile') -> NoReturn:
     "A prompt-read-eval-print loop."
     global_env = Environment({}, standard_env())
+    evaluator = get_engine(engine)
     while True:
         ast = parse(input(prompt))
-        val = evaluate(ast, global_env)
+        val = evaluator(ast, global_env)
         if val is not None:
             print(lispstr(val))
 
@@ -192,23 +211,458 @@ class Procedure:
 # end::PROCEDURE[]
 
 
+################ Compiler
+
+# A frame holds the values bound by one call of a compiled procedure:
+# the enclosing frame at index 0, then the parameters and local definitions.
+# Top-level code runs with no frame; its variables live in an Environment.
+Frame: TypeAlias = list[Any]
+
+# A compiled expression is a closure that takes the
+# run-time frame and returns the value of the expression.
+Compiled: TypeAlias = Callable[[Frame | None], Any]
+
+# A lexical address is the number of frames to go out, and the index there.
+Address: TypeAlias = tuple[int, int]
+
+UNASSIGNED = object()  # value of a local definition before it is run
+
+# Set by lisprof.profiling() to instrument code compiled in the meantime;
+# when it is None, compiled code has no profiling hooks at all.
+PROFILER: Any = None
+
+def instrument(key: str, code: Compiled) -> Compiled:
+    "Wrap code to be timed under key, if a profiler is active."
+    if PROFILER is None:
+        return code
+    return PROFILER.wrap(key, code)
+
+
+class Scope:
+    "Compile-time record of the names bound by a procedure, in frame order."
+
+    def __init__(
+        self,
+        parms: list[Symbol],
+        definitions: Iterable[Symbol],
+        outer: 'Scope | Environment',
+    ):
+        local_names = [name for name in dict.fromkeys(definitions)
+                       if name not in parms]
+        self.names = list(parms) + local_names
+        self.index = {name: i for i, name in enumerate(self.names, 1)}
+        self.parm_count = len(parms)
+        self.outer = outer
+
+def lexical_address(name: Symbol, scope: Scope | Environment) -> Address | None:
+    "Find the frame depth and index of name, or None if it is global."
+    depth = 0
+    while isinstance(scope, Scope):
+        if name in scope.index:
+            return depth, scope.index[name]
+        scope = scope.outer
+        depth += 1
+    return None
+
+def global_scope(scope: Scope | Environment) -> Environment:
+    "Find the global environment at the root of scope."
+    while isinstance(scope, Scope):
+        scope = scope.outer
+    return scope
+
+def definitions(body: list[Expression]) -> Iterator[Symbol]:
+    "Yield the names defined in body, not counting nested lambdas."
+    for exp in body:
+        match exp:
+            case ['quote', _] | ['lambda', *_]:
+                pass
+            case ['define', Symbol(name), value_exp]:
+                yield name
+                yield from definitions([value_exp])
+            case ['define' | 'define-memo', [Symbol(name), *_], *_]:
+                yield name
+            case [*exps]:
+                yield from definitions(exps)
+
+def compile(
+    exp: Expression, scope: Scope | Environment, tail: bool = False
+) -> Compiled:
+    """Translate an expression into a closure, once, ahead of evaluation.
+
+    If tail is true, exp is in tail position in a procedure body,
+    and a call to a compiled procedure returns a TailCall to be
+    run by the caller instead of growing the Python stack.
+    """
+    match exp:
+        case int(x) | float(x):
+            return lambda frame: x
+        case Symbol(var):
+            return compile_ref(var, scope)
+        case ['quote', x]:
+            return lambda frame: x
+        case ['if', test, consequence, alternative]:
+            test_c = compile(test, scope)
+            consequence_c = compile(consequence, scope, tail)
+            alternative_c = compile(alternative, scope, tail)
+            return instrument('[if]', lambda frame: (
+                consequence_c(frame) if test_c(frame) else alternative_c(frame)
+            ))
+        case ['lambda', [*parms], *body] if body:
+            return instrument('[lambda]', compile_procedure(parms, body, scope))
+        case ['begin', *body] if body:
+            return instrument('[begin]', compile_body(body, scope, tail))
+        case ['define', Symbol(name), ['lambda', [*parms], *body]] if body:
+            procedure_c = compile_procedure(parms, body, scope, name)
+            return instrument('[define]', compile_define(name, procedure_c, scope))
+        case ['define', Symbol(name), value_exp]:
+            define_c = compile_define(name, compile(value_exp, scope), scope)
+            return instrument('[define]', define_c)
+        case ['define', [Symbol(name), *parms], *body] if body:
+            procedure_c = compile_procedure(parms, body, scope, name)
+            return instrument('[define]', compile_define(name, procedure_c, scope))
+        case ['define-memo', [Symbol(name), *parms], *body] if body:
+            procedure_c = compile_procedure(parms, body, scope, name, MemoProcedure)
+            return instrument('[define]', compile_define(name, procedure_c, scope))
+        case ['set!', Symbol(name), value_exp]:
+            set_c = compile_set(name, compile(value_exp, scope), scope)
+            return instrument('[set!]', set_c)
+        case [func_exp, *args] if func_exp not in KEYWORDS:
+            if tail:
+                return compile_tail_call(func_exp, args, scope)
+            return compile_call(func_exp, args, scope)
+        case _:
+            raise SyntaxError(lispstr(exp))
+
+def compile_ref(var: Symbol, scope: Scope | Environment) -> Compiled:
+    "Compile a variable reference to a lookup at its lexical address."
+    address = lexical_address(var, scope)
+    if address is None:
+        global_env = global_scope(scope)
+        return lambda frame: global_env[var]
+    depth, index = address
+    if depth == 0 and index <= scope.parm_count:  # type: ignore[union-attr]
+        return lambda frame: frame[index]  # parameters are always bound
+    def local_ref(frame: Frame) -> Any:
+        for _ in range(depth):
+            frame = frame[0]
+        value = frame[index]
+        if value is UNASSIGNED:
+            raise KeyError(var)
+        return value
+    return local_ref
+
+def compile_define(
+    name: Symbol, value_c: Compiled, scope: Scope | Environment
+) -> Compiled:
+    "Compile a definition, local to the innermost frame or global."
+    if isinstance(scope, Scope):
+        index = scope.index[name]
+        def define_local(frame: Frame) -> None:
+            frame[index] = value_c(frame)
+        return define_local
+    def define_global(frame: None) -> None:
+        scope[name] = value_c(frame)
+    return define_global
+
+def compile_set(
+    name: Symbol, value_c: Compiled, scope: Scope | Environment
+) -> Compiled:
+    "Compile an assignment to the variable at its lexical address."
+    address = lexical_address(name, scope)
+    if address is None:
+        global_env = global_scope(scope)
+        return lambda frame: global_env.change(name, value_c(frame))
+    depth, index = address
+    def set_local(frame: Frame) -> None:
+        value = value_c(frame)
+        for _ in range(depth):
+            frame = frame[0]
+        if frame[index] is UNASSIGNED:
+            raise KeyError(name)
+        frame[index] = value
+    return set_local
+
+def compile_call(
+    func_exp: Expression, args: list[Expression], scope: Scope | Environment
+) -> Compiled:
+    "Compile a procedure call, with fast paths for the common arities."
+    proc_c = compile(func_exp, scope)
+    match [compile(arg, scope) for arg in args]:
+        case []:
+            return lambda frame: proc_c(frame)()
+        case [arg_c]:
+            return lambda frame: proc_c(frame)(arg_c(frame))
+        case [arg0_c, arg1_c]:
+            return lambda frame: proc_c(frame)(arg0_c(frame), arg1_c(frame))
+        case [arg0_c, arg1_c, arg2_c]:
+            return lambda frame: proc_c(frame)(
+                arg0_c(frame), arg1_c(frame), arg2_c(frame))
+        case args_c:
+            return lambda frame: proc_c(frame)(
+                *[arg_c(frame) for arg_c in args_c])
+
+def compile_tail_call(
+    func_exp: Expression, args: list[Expression], scope: Scope | Environment
+) -> Compiled:
+    "Compile a call in tail position, deferring compiled procedures."
+    proc_c = compile(func_exp, scope)
+    args_c = [compile(arg, scope) for arg in args]
+    def tail_call(frame: Frame | None) -> Any:
+        proc = proc_c(frame)
+        values = [arg_c(frame) for arg_c in args_c]
+        if type(proc) is CompiledProcedure:
+            return TailCall(proc, values)
+        return proc(*values)
+    return tail_call
+
+def compile_body(
+    body: list[Expression], scope: Scope | Environment, tail: bool = True
+) -> Compiled:
+    "Compile a sequence of expressions returning the value of the last."
+    *init, last = body
+    init_c = [compile(exp, scope) for exp in init]
+    last_c = compile(last, scope, tail)
+    if not init_c:
+        return last_c
+    def sequence(frame: Frame | None) -> Any:
+        for exp_c in init_c:
+            exp_c(frame)
+        return last_c(frame)
+    return sequence
+
+def compile_procedure(
+    parms: list[Symbol],
+    body: list[Expression],
+    scope: Scope | Environment,
+    name: str = 'lambda',
+    procedure_class: type['CompiledProcedure'] | None = None,
+) -> Compiled:
+    "Compile the body once; each evaluation makes a new closure over it."
+    local_scope = Scope(parms, definitions(body), scope)
+    code = instrument(name, compile_body(body, local_scope))
+    local_count = len(local_scope.names) - len(parms)
+    cls = CompiledProcedure if procedure_class is None else procedure_class
+    return lambda frame: cls(parms, body, frame, code, local_count)
+
+
+class CompiledProcedure(Procedure):
+    "A user-defined Scheme procedure with a compiled body."
+
+    def __init__(
+        self,
+        parms: list[Symbol],
+        body: list[Expression],
+        env: Frame | None,
+        code: Compiled,
+        local_count: int = 0,
+    ):
+        super().__init__(parms, body, env)  # type: ignore[arg-type]
+        self.code = code
+        self.locals = (UNASSIGNED,) * local_count
+
+    def __call__(self, *args: Expression) -> Any:
+        proc = self
+        while True:  # trampoline: run tail calls in this Python frame
+            if len(args) != len(proc.parms):
+                raise TypeError(f'expected {lispstr(proc.parms)}, '
+                                f'given {lispstr(list(args))}')
+            result = proc.code([proc.env, *args, *proc.locals])
+            if type(result) is not TailCall:
+                return result
+            proc, args = result.proc, result.args
+
+
+MEMO_MAXSIZE = 1024  # results kept by each procedure made with define-memo
+
+
+class MemoProcedure(CompiledProcedure):
+    """A compiled procedure that caches its most recent results.
+
+    Results are cached only for calls with hashable arguments:
+    numbers and symbols, but not lists.
+    """
+
+    def __init__(self, *args: Any, maxsize: int | None = None):
+        super().__init__(*args)
+        if maxsize is None:
+            maxsize = MEMO_MAXSIZE
+        self.cached_call = functools.lru_cache(maxsize, typed=True)(
+            super().__call__)
+
+    def __call__(self, *args: Expression) -> Any:
+        try:
+            hash(args)
+        except TypeError:
+            return super().__call__(*args)
+        return self.cached_call(*args)
+
+    def cache_info(self) -> 'CacheInfo':
+        return CacheInfo(*self.cached_call.cache_info())
+
+
+class TailCall:
+    "A call in tail position, returned to the trampoline to run."
+
+    __slots__ = ('proc', 'args')
+
+    def __init__(self, proc: CompiledProcedure, args: list[Any]):
+        self.proc = proc
+        self.args = args
+
+
+def execute(exp: Expression, env: Environment) -> Any:
+    "Compile an expression and run it at the top level of an environment."
+    return compile(exp, env)(None)
+
+def execute_vm(exp: Expression, env: Environment) -> Any:
+    "Compile an expression to bytecode and run it in the lisvm machine."
+    import lisvm  # not at the top: lisvm imports lis
+    return lisvm.execute(exp, env)
+
+ENGINES: dict[str, Callable[[Expression, Environment], Any]] = {
+    'compile': execute,
+    'evaluate': evaluate,
+    'vm': execute_vm,
+}
+
+def get_engine(name: str) -> Callable[[Expression, Environment], Any]:
+    "Look up an execution engine by name."
+    try:
+        return ENGINES[name]
+    except KeyError:
+        raise ValueError(f'unknown engine: {name!r}') from None
+
+
+################ Program cache
+
+CACHE_VERSION = 1  # increment when the representation of parsed code changes
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class ProgramCache:
+    """Parsed programs keyed by a hash of their source code.
+
+    The most recently used programs are kept in memory, up to maxsize.
+    If directory is given, parsed programs are also saved there with
+    marshal, stamped with CACHE_VERSION and the Python version, so a
+    warm start in another process skips tokenizing and parsing too.
+    """
+
+    def __init__(self, maxsize: int = 128, directory: str | None = None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.programs: OrderedDict[str, list[Expression]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def parse(self, source: str) -> list[Expression]:
+        "Return the top-level expressions of source, parsing it on a miss."
+        key = hashlib.sha256(source.encode()).hexdigest()
+        program = self.programs.get(key)
+        if program is None:
+            program = self.load(key)
+        if program is None:
+            self.misses += 1
+            program = list(read_forms([source]))
+            self.save(key, program)
+        else:
+            self.hits += 1
+        self.programs[key] = program
+        self.programs.move_to_end(key)
+        if len(self.programs) > self.maxsize:
+            self.programs.popitem(last=False)
+        return program
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self.programs))
+
+    def clear(self) -> None:
+        "Forget the programs in memory; files in directory are kept."
+        self.programs.clear()
+        self.hits = self.misses = 0
+
+    def stamp(self) -> tuple[int, str | None, int]:
+        return CACHE_VERSION, sys.implementation.cache_tag, marshal.version
+
+    def path(self, key: str) -> str:
+        assert self.directory is not None
+        return os.path.join(self.directory, key + '.lisc')
+
+    def load(self, key: str) -> list[Expression] | None:
+        "Read a parsed program from directory, if saved with this stamp."
+        if self.directory is None:
+            return None
+        try:
+            with open(self.path(key), 'rb') as fp:
+                stamp, program = marshal.load(fp)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if tuple(stamp) != self.stamp():
+            return None
+        return program
+
+    def save(self, key: str, program: list[Expression]) -> None:
+        "Write a parsed program to directory; a failure only costs a miss."
+        if self.directory is None:
+            return
+        temp_path = f'{self.path(key)}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temp_path, 'wb') as fp:
+                marshal.dump((self.stamp(), program), fp)
+            os.replace(temp_path, self.path(key))
+        except (OSError, ValueError):
+            pass
+
+
 ################ command-line interface
 
-def run(source: str) -> Any:
-    global_env = Environment({}, standard_env())
-    tokens = tokenize(source)
-    while tokens:
-        exp = read_from_tokens(tokens)
-        result = evaluate(exp, global_env)
+def run(
+    source: str | TextIO,
+    engine: str = 'compile',
+    cache: ProgramCache | None = None,
+    env: Environment | None = None,
+    optimize: bool = False,
+) -> Any:
+    """Run a program given as a string or as a text file.
+
+    With a cache, the program is read whole and parsed only if its
+    source code is not found in the cache. The program runs in env,
+    or else in a new environment with the standard procedures.
+    If optimize is true, the whole program is read and rewritten
+    by lisopt.optimize_program before it runs.
+    """
+    forms: Iterable[Expression]
+    if cache is not None:
+        if not isinstance(source, str):
+            source = source.read()
+        forms = cache.parse(source)
+    else:
+        if isinstance(source, str):
+            source = io.StringIO(source)
+        forms = read_forms(source)
+    global_env = Environment({}, standard_env()) if env is None else env
+    if optimize:
+        import lisopt  # not at the top: lisopt imports lis
+        forms = lisopt.optimize_program(forms, global_env)
+    evaluator = get_engine(engine)
+    result = None
+    for exp in forms:
+        result = evaluator(exp, global_env)
     return result
 
 def main(args: list[str]) -> None:
     if len(args) == 1:
         with open(args[0]) as fp:
-            run(fp.read())
+            run(fp)
     else:
         repl()
 
 if __name__ == '__main__':
-    import sys
     main(sys.argv[1:])
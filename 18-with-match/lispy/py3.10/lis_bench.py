@@ -0,0 +1,69 @@
+"""
+Compare the lis.py engines on tail and non-tail recursive code.
+
+Usage: python3 lis_bench.py
+"""
+
+import timeit
+from collections.abc import Iterator
+from contextlib import contextmanager, nullcontext
+
+import lis
+from lis import run
+
+# non-tail recursion: the result of each call is used by `+`
+FIB_SRC = """
+(define (fib n)
+    (if (< n 2)
+        n
+        (+ (fib (- n 1)) (fib (- n 2)))))
+(fib {n})
+"""
+
+# tail recursion: each call is the last thing `loop` does
+LOOP_SRC = """
+(define (loop n acc)
+    (if (= n 0)
+        acc
+        (loop (- n 1) (+ acc 1))))
+(loop {n} 0)
+"""
+
+# `compile` with calls in tail position compiled as ordinary calls
+NO_TRAMPOLINE = 'no-tramp'
+
+CASES = [
+    # label, source, n, engines
+    ('fib', FIB_SRC, 18, ['evaluate', 'compile', NO_TRAMPOLINE, 'vm']),
+    ('loop', LOOP_SRC, 150, ['evaluate', 'compile', NO_TRAMPOLINE, 'vm']),
+    ('loop', LOOP_SRC, 1_000_000, ['compile', 'vm']),  # too deep for `evaluate`
+]
+
+@contextmanager
+def no_trampoline() -> Iterator[None]:
+    "Compile calls in tail position with compile_call, as before TailCall."
+    saved = lis.compile_tail_call
+    lis.compile_tail_call = lis.compile_call
+    try:
+        yield
+    finally:
+        lis.compile_tail_call = saved
+
+def bench(source: str, engine: str, repeat: int = 3) -> float:
+    context = no_trampoline() if engine == NO_TRAMPOLINE else nullcontext()
+    if engine == NO_TRAMPOLINE:
+        engine = 'compile'
+    with context:
+        times = timeit.repeat(lambda: run(source, engine),
+                              number=1, repeat=repeat)
+    return min(times)
+
+def main() -> None:
+    print(f'{"case":>16}  {"engine":>8}  {"seconds":>9}')
+    for label, source, n, engines in CASES:
+        for engine in engines:
+            secs = bench(source.format(n=n), engine)
+            print(f'{label:>6} {n:>9,}  {engine:>8}  {secs:9.4f}')
+
+if __name__ == '__main__':
+    main()
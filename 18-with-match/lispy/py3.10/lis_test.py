@@ -1,8 +1,13 @@
+import io
 from typing import Optional
 
-from pytest import mark, fixture
+from pytest import mark, fixture, raises
 
+import lis
 from lis import parse, evaluate, Expression, Environment, standard_env
+from lis import read_forms
+from lis import compile, execute, run, CompiledProcedure
+from lis import ProgramCache, CacheInfo
 
 ############################################################# tests for parse
 
@@ -19,6 +24,25 @@ def test_parse(source: str, expected: Expression) -> None:
     assert got == expected
 
 
+@mark.parametrize( 'source', ['', '(', '(a (b)', ')'])
+def test_parse_syntax_error(source: str) -> None:
+    with raises(SyntaxError):
+        parse(source)
+
+
+def test_read_forms() -> None:
+    lines = io.StringIO('(define x\n  (+ 1 2))\n(* x\n x) 7\n')
+    forms = read_forms(lines)
+    assert next(forms) == ['define', 'x', ['+', 1, 2]]
+    assert next(forms) == ['*', 'x', 'x']
+    assert list(forms) == [7]
+
+
+def test_run_file_object() -> None:
+    source = io.StringIO('(define (sq x) (* x x))\n(sq 12)\n')
+    assert run(source) == 144
+
+
 ########################################################## tests for evaluate
 
 # Norvig's tests are not isolated: they assume the
@@ -178,3 +202,205 @@ def test_define_function(std_env: Environment) -> None:
     assert max_fn.env is std_env
     assert max_fn(1, 2) == 2
     assert max_fn(3, 2) == 3
+
+
+############################################################ tests for compile
+
+@mark.parametrize( 'source, expected', [
+    ('7', 7),
+    ('(quote (a 1))', ['a', 1]),
+    ('(if (> 6 5) (+ 1 1) no-such-thing)', 2),
+    ('(if (< 6 5) no-such-thing (+ 2 2))', 4),
+    ('((lambda (x y) (* x y)) 6 7)', 42),
+    ('((lambda () 42))', 42),
+    ('(max 1 2 3 4 5)', 5),
+])
+def test_compile(source: str, expected: Expression, std_env: Environment) -> None:
+    got = compile(parse(source), std_env)(None)
+    assert got == expected
+
+
+def test_compile_once_run_many(std_env: Environment) -> None:
+    code = compile(parse('(* x 2)'), std_env)
+    std_env['x'] = 3
+    assert code(None) == 6
+    std_env['x'] = 4
+    assert code(None) == 8
+
+
+def test_compile_define_function(std_env: Environment) -> None:
+    source = '(define (max a b) (if (>= a b) a b))'
+    got = execute(parse(source), std_env)
+    assert got is None
+    max_fn = std_env['max']
+    assert isinstance(max_fn, CompiledProcedure)
+    assert max_fn.parms == ['a', 'b']
+    assert max_fn(1, 2) == 2
+    assert max_fn(3, 2) == 3
+
+
+def test_compile_inner_define_is_local(std_env: Environment) -> None:
+    source = """
+        (define (f)
+            (define x 1)
+            (set! x (+ x 1))
+            x)
+        """
+    execute(parse(source), std_env)
+    assert std_env['f']() == 2
+    assert 'x' not in std_env
+
+
+def test_compile_set_global(std_env: Environment) -> None:
+    execute(parse('(define n 0)'), std_env)
+    execute(parse('(define (inc!) (set! n (+ n 1)))'), std_env)
+    execute(parse('(inc!)'), std_env)
+    assert std_env['n'] == 1
+
+
+def test_compile_syntax_error(std_env: Environment) -> None:
+    with raises(SyntaxError):
+        compile(parse('(lambda is not like this)'), std_env)
+
+
+@mark.parametrize('engine', ['compile', 'evaluate'])
+def test_run_engine(engine: str) -> None:
+    source = '(define (sq x) (* x x)) (sq 12)'
+    assert run(source, engine) == 144
+
+
+def test_run_unknown_engine() -> None:
+    with raises(ValueError):
+        run('1', 'no-such-engine')
+
+
+def test_compile_begin(std_env: Environment) -> None:
+    source = '(begin (define x 6) (* x 7))'
+    assert execute(parse(source), std_env) == 42
+
+
+def test_tail_call_constant_stack() -> None:
+    source = """
+        (define (loop n acc)
+            (if (= n 0)
+                acc
+                (loop (- n 1) (+ acc 1))))
+        (loop 20000 0)
+        """
+    assert run(source) == 20000
+
+
+def test_mutual_tail_calls_constant_stack() -> None:
+    source = """
+        (define (even? n) (if (= n 0) 1 (odd? (- n 1))))
+        (define (odd? n) (if (= n 0) 0 (even? (- n 1))))
+        (even? 20001)
+        """
+    assert run(source) == 0
+
+
+def test_compile_set_in_outer_frame(std_env: Environment) -> None:
+    source = """
+        (define (make-counter)
+            (define n 0)
+            (lambda () (set! n (+ n 1)) n))
+        """
+    execute(parse(source), std_env)
+    counter = std_env['make-counter']()
+    counter()
+    assert counter() == 2
+    assert counter.env[1:] == [2]  # frame of make-counter: outer frame, n
+
+
+def test_compile_local_used_before_definition(std_env: Environment) -> None:
+    execute(parse('(define (f) (define y x) (define x 1) y)'), std_env)
+    with raises(KeyError):
+        std_env['f']()
+
+
+def test_compiled_procedure_arity(std_env: Environment) -> None:
+    execute(parse('(define (f a b) a)'), std_env)
+    with raises(TypeError):
+        std_env['f'](1)
+
+
+############################################################## tests for cache
+
+def test_cache_hit_skips_parsing(monkeypatch) -> None:
+    cache = ProgramCache()
+    source = '(define (sq x) (* x x)) (sq 12)'
+    assert run(source, cache=cache) == 144
+    monkeypatch.setattr(lis, 'read_forms', None)
+    assert run(source, cache=cache) == 144
+    assert cache.cache_info() == CacheInfo(hits=1, misses=1, maxsize=128, currsize=1)
+
+
+def test_cache_evicts_least_recently_used() -> None:
+    cache = ProgramCache(maxsize=2)
+    for source in ['1', '2', '1', '3']:
+        cache.parse(source)
+    assert [exp for [exp] in cache.programs.values()] == [1, 3]
+
+
+def test_cache_directory(tmp_path) -> None:
+    source = '(define (sq x) (* x x)) (sq 12)'
+    ProgramCache(directory=str(tmp_path)).parse(source)
+    assert len(list(tmp_path.glob('*.lisc'))) == 1
+    warm_cache = ProgramCache(directory=str(tmp_path))
+    assert run(source, cache=warm_cache) == 144
+    assert warm_cache.cache_info().hits == 1
+
+
+def test_cache_directory_ignores_other_versions(tmp_path, monkeypatch) -> None:
+    ProgramCache(directory=str(tmp_path)).parse('(+ 1 2)')
+    monkeypatch.setattr(lis, 'CACHE_VERSION', lis.CACHE_VERSION + 1)
+    cache = ProgramCache(directory=str(tmp_path))
+    assert cache.parse('(+ 1 2)') == [['+', 1, 2]]
+    assert cache.cache_info().misses == 1
+
+
+########################################################## tests for define-memo
+
+fib_memo_src = """
+(define-memo (fib n)
+    (if (< n 2)
+        n
+        (+ (fib (- n 1)) (fib (- n 2)))))
+"""
+
+def test_define_memo(std_env: Environment) -> None:
+    execute(parse(fib_memo_src), std_env)
+    assert execute(parse('(fib 80)'), std_env) == 23416728348467685
+    assert execute(parse('(memo-info fib)'), std_env) == [78, 81, 1024, 81]
+
+
+def test_define_memo_bounded(std_env: Environment, monkeypatch) -> None:
+    monkeypatch.setattr(lis, 'MEMO_MAXSIZE', 10)
+    execute(parse(fib_memo_src), std_env)
+    execute(parse('(fib 30)'), std_env)
+    hits, misses, maxsize, currsize = std_env['fib'].cache_info()
+    assert (maxsize, currsize) == (10, 10)
+
+
+def test_define_memo_unhashable_arguments(std_env: Environment) -> None:
+    execute(parse('(define-memo (total lst) (apply + lst))'), std_env)
+    assert execute(parse('(total (list 1 2))'), std_env) == 3
+    assert execute(parse('(memo-info total)'), std_env) == [0, 0, 1024, 0]
+
+
+def test_define_memo_typed(std_env: Environment) -> None:
+    execute(parse('(define-memo (id x) x)'), std_env)
+    assert execute(parse('(id 1)'), std_env) == 1
+    result = execute(parse('(id 1.0)'), std_env)
+    assert type(result) is float
+
+
+def test_define_memo_local(std_env: Environment) -> None:
+    source = """
+        (define (f n)
+            (define-memo (g k) (* k 2))
+            (+ (g n) (g n)))
+        """
+    execute(parse(source), std_env)
+    assert std_env['f'](5) == 20
+    assert 'g' not in std_env
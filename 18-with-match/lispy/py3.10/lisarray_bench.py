@@ -0,0 +1,49 @@
+"""
+Compare `map` + `lambda` with the lisarray vector procedures.
+
+Usage: python3 lisarray_bench.py [size]
+"""
+
+import random
+import sys
+import timeit
+
+from lis import Environment, run, standard_env
+from lisarray import vector_env, np
+
+CASES = [
+    # label, source with lists, source with vectors
+    ('scale',
+     '(map (lambda (x) (* x 2.5)) xs)',
+     '(vector* xs 2.5)'),
+    ('add',
+     '(map (lambda (x y) (+ x y)) xs ys)',
+     '(vector+ xs ys)'),
+    ('square',
+     '(map (lambda (x) (* x x)) xs)',
+     '(vector-map (lambda (x) (* x x)) xs)'),
+]
+
+def bench(source: str, env: Environment, repeat: int = 5) -> float:
+    times = timeit.repeat(lambda: run(source, env=env), number=1, repeat=repeat)
+    return min(times)
+
+def main(size: int) -> None:
+    xs = [random.random() for _ in range(size)]
+    ys = [random.random() for _ in range(size)]
+    list_env = Environment({'xs': xs, 'ys': ys}, standard_env())
+    envs = [('map+lambda', list_env)]
+    backends = [False, True] if np is not None else [False]
+    for numpy in backends:
+        env = vector_env(numpy)
+        env['xs'] = env['list->vector'](xs)
+        env['ys'] = env['list->vector'](ys)
+        envs.append(('numpy' if numpy else 'array', env))
+    print(f'{size:,} elements')
+    for label, list_source, vector_source in CASES:
+        for env_label, env in envs:
+            source = list_source if env is list_env else vector_source
+            print(f'{label:>8} {env_label:>12}  {bench(source, env):9.4f}s')
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
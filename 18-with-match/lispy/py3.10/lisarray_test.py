@@ -0,0 +1,52 @@
+from array import array
+
+from pytest import fixture, importorskip, mark, approx, raises
+
+from lis import run, Environment
+from lisarray import vector_env
+
+
+@fixture(params=[False, True], ids=['array', 'numpy'])
+def env(request) -> Environment:
+    if request.param:
+        importorskip('numpy')
+    return vector_env(numpy=request.param)
+
+
+@mark.parametrize('source, expected', [
+    ('(vector->list (vector 1 2 3))', [1.0, 2.0, 3.0]),
+    ('(vector->list (vector+ (vector 1 2) (vector 10 20)))', [11.0, 22.0]),
+    ('(vector->list (vector- (vector 1 2) 1))', [0.0, 1.0]),
+    ('(vector->list (vector* 2 (vector 1 2)))', [2.0, 4.0]),
+    ('(vector->list (vector/ (vector 1 2) (vector 4 4)))', [0.25, 0.5]),
+    ('(vector->list (vector-map (lambda (x) (* x x)) (vector 1 2 3)))', [1.0, 4.0, 9.0]),
+    ('(vector->list (make-vector 3 1.5))', [1.5, 1.5, 1.5]),
+    ('(vector->list (list->vector (list 1 2)))', [1.0, 2.0]),
+    ('(vector-ref (vector 1 2 3) 1)', 2.0),
+    ('(vector-length (vector 1 2 3))', 3),
+    ('(vector-sum (vector 0.1 0.2 0.3))', approx(0.6)),
+    ('(dot (vector 1 2 3) (vector 4 5 6))', 32.0),
+])
+def test_vector_procedures(source: str, expected: object, env: Environment) -> None:
+    assert run(source, env=env) == expected
+
+
+def test_array_backend() -> None:
+    got = run('(vector 1 2)', env=vector_env(numpy=False))
+    assert got == array('d', [1.0, 2.0])
+
+
+def test_vector_env_has_standard_procedures() -> None:
+    assert run('(car (list 1 2))', env=vector_env(numpy=False)) == 1
+
+
+@mark.parametrize('source, error', [
+    ('(vector+ 1 2)', TypeError),
+    ('(vector+ (vector 1 2) (vector 1 2 3))', ValueError),
+    ('(vector* (vector 1) (vector 1 2 3))', ValueError),
+    ('(dot (vector 1 2) (vector 1 2 3))', ValueError),
+    ('(dot 1 (vector 1 2))', TypeError),
+])
+def test_vector_errors(source: str, error: type[Exception], env: Environment) -> None:
+    with raises(error):
+        run(source, env=env)
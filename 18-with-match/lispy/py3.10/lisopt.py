@@ -0,0 +1,139 @@
+"""
+Optimizer for lis.py programs: constant folding and dead-branch elimination.
+
+`optimize_program` rewrites parsed expressions before they are run:
+
+* calls to pure built-in procedures with constant arguments are
+  replaced by their results;
+* `if` expressions with a constant test are replaced by the branch taken;
+* quoted numbers are replaced by the numbers themselves.
+
+A procedure is folded only if its name is bound to the standard built-in
+in the environment, and is not bound by `define`, `set!` or a parameter
+anywhere in the program.
+
+>>> from lis import parse, standard_env
+>>> exp = parse('(lambda (x) (if (> 2 1) (* x (+ 2 3)) (quote never)))')
+>>> optimize_program([exp], standard_env())
+[['lambda', ['x'], ['*', 'x', 5]]]
+"""
+
+import math
+import operator as op
+from collections.abc import Callable, Iterable, Iterator
+from typing import Any
+
+from lis import Symbol, Expression, Environment
+
+PURE_PROCEDURES: dict[Symbol, Callable] = {
+    '+': op.add,
+    '-': op.sub,
+    '*': op.mul,
+    '/': op.truediv,
+    'quotient': op.floordiv,
+    '>': op.gt,
+    '<': op.lt,
+    '>=': op.ge,
+    '<=': op.le,
+    '=': op.eq,
+    'equal?': op.eq,
+    'not': op.not_,
+    'abs': abs,
+    'max': max,
+    'min': min,
+    'round': round,
+    'sqrt': math.sqrt,
+    'exp': math.exp,
+    'log': math.log,
+    'sin': math.sin,
+    'cos': math.cos,
+    'tan': math.tan,
+    'floor': math.floor,
+    'ceil': math.ceil,
+}
+
+
+def assigned_names(exps: Iterable[Expression]) -> Iterator[Symbol]:
+    "Yield every name bound by define or set! in exps, at any depth."
+    for exp in exps:
+        match exp:
+            case ['quote', _]:
+                pass
+            case ['define' | 'set!', Symbol(name), *rest]:
+                yield name
+                yield from assigned_names(rest)
+            case ['define' | 'define-memo', [Symbol(name), *_], *body]:
+                yield name
+                yield from assigned_names(body)
+            case [*exps]:
+                yield from assigned_names(exps)
+
+def is_constant(exp: Expression) -> bool:
+    match exp:
+        case int() | float() | ['quote', _]:
+            return True
+    return False
+
+def constant_value(exp: Expression) -> Any:
+    match exp:
+        case ['quote', x]:
+            return x
+    return exp
+
+def literal(value: Any) -> Expression:
+    "An expression that evaluates to value."
+    if isinstance(value, (int, float)):
+        return value
+    return ['quote', value]
+
+def optimize_program(
+    exps: Iterable[Expression], env: Environment
+) -> list[Expression]:
+    "Optimize a whole program to run in env."
+    exps = list(exps)
+    unsafe = frozenset(assigned_names(exps))
+    foldable = {name: func for name, func in PURE_PROCEDURES.items()
+                if name not in unsafe and env.get(name) is func}
+    return [optimize(exp, foldable) for exp in exps]
+
+def optimize(exp: Expression, foldable: dict[Symbol, Callable]) -> Expression:
+    "Rewrite exp, folding calls to the procedures in foldable."
+    match exp:
+        case ['quote', int(x) | float(x)]:
+            return x
+        case ['quote', _]:
+            return exp
+        case ['if', test, consequence, alternative]:
+            test = optimize(test, foldable)
+            if is_constant(test):
+                branch = consequence if constant_value(test) else alternative
+                return optimize(branch, foldable)
+            return ['if', test, optimize(consequence, foldable),
+                    optimize(alternative, foldable)]
+        case ['lambda', [*parms], *body]:
+            inner = shadow(foldable, parms)
+            return ['lambda', parms, *[optimize(x, inner) for x in body]]
+        case [('define' | 'define-memo') as keyword, [*signature], *body]:
+            inner = shadow(foldable, signature[1:])
+            return [keyword, signature, *[optimize(x, inner) for x in body]]
+        case [Symbol(name), *args] if name in foldable:
+            args = [optimize(arg, foldable) for arg in args]
+            if all(is_constant(arg) for arg in args):
+                try:
+                    value = foldable[name](*map(constant_value, args))
+                except Exception:  # leave it to fail at run time, if reached
+                    pass
+                else:
+                    return literal(value)
+            return [name, *args]
+        case [*exps]:
+            return [optimize(x, foldable) for x in exps]
+    return exp
+
+def shadow(
+    foldable: dict[Symbol, Callable], names: list[Symbol]
+) -> dict[Symbol, Callable]:
+    "Drop from foldable the procedures that names rebind in a local scope."
+    if not foldable.keys() & set(names):
+        return foldable
+    return {name: func for name, func in foldable.items() if name not in names}
@@ -0,0 +1,42 @@
+"""
+Run a program in the style of generated code with and without lisopt.
+
+Usage: python3 lisopt_bench.py
+"""
+
+import timeit
+
+from lis import run
+
+# constant expressions and branches, as a code generator might emit them
+GENERATED_SRC = """
+(define (scale x)
+    (if (> 2 1)
+        (* x (/ (* 60 60) (+ 10 (* 2 45))))
+        (quote unreachable)))
+(define (offset x)
+    (if (= (quotient 10 3) 3)
+        (+ x (- (* 4 (quote 8)) (max 1 2 30)))
+        (- x 1)))
+(define (loop n acc)
+    (if (= n 0)
+        acc
+        (loop (- n 1) (+ acc (offset (scale n))))))
+(loop 50000 0)
+"""
+
+def bench(optimize: bool, repeat: int = 5) -> float:
+    times = timeit.repeat(lambda: run(GENERATED_SRC, optimize=optimize),
+                          number=1, repeat=repeat)
+    return min(times)
+
+def main() -> None:
+    assert run(GENERATED_SRC, optimize=True) == run(GENERATED_SRC)
+    before = bench(optimize=False)
+    after = bench(optimize=True)
+    print(f'before: {before:.4f}s')
+    print(f' after: {after:.4f}s')
+    print(f'speedup: {before / after:.2f}x')
+
+if __name__ == '__main__':
+    main()
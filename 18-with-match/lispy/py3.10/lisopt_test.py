@@ -0,0 +1,56 @@
+from pytest import mark
+
+from lis import parse, run, standard_env
+from lisopt import optimize_program
+
+import examples_test
+
+
+@mark.parametrize('source, expected', [
+    ('(+ 1 2)', 3),
+    ('(* 2 (+ 3 4))', 14),
+    ('(if (< 1 2) x y)', 'x'),
+    ('(if 0 x y)', 'y'),
+    ('(if (quote ()) x y)', 'y'),
+    ('(quote 7)', 7),
+    ('(quote (+ 1 2))', ['quote', ['+', 1, 2]]),
+    ('(+ x (* 2 3))', ['+', 'x', 6]),
+    ('(car (quote (1 2)))', ['car', ['quote', [1, 2]]]),  # car is not folded
+    ('(/ 1 0)', ['/', 1, 0]),  # fails at run time, if reached
+    ('(if x (- 5 2) (sqrt 16))', ['if', 'x', 3, 4.0]),
+])
+def test_optimize(source: str, expected: object) -> None:
+    [got] = optimize_program([parse(source)], standard_env())
+    assert got == expected
+
+
+def test_optimize_respects_global_define() -> None:
+    exps = [parse('(define (f) (+ 1 2))'), parse('(define + -)')]
+    assert optimize_program(exps, standard_env()) == exps
+
+
+def test_optimize_respects_set() -> None:
+    exps = [parse('(set! max min)'), parse('(max 1 2)')]
+    assert optimize_program(exps, standard_env()) == exps
+
+
+def test_optimize_respects_parameter() -> None:
+    exp = parse('(lambda (+) (+ 1 2))')
+    assert optimize_program([exp], standard_env()) == [exp]
+
+
+def test_optimize_respects_environment() -> None:
+    env = standard_env()
+    env['+'] = lambda a, b: a * b
+    exp = parse('(+ 2 3)')
+    assert optimize_program([exp], env) == [exp]
+
+
+@mark.parametrize('source', [
+    examples_test.fact_src,
+    examples_test.quicksort_src,
+    examples_test.newton_src,
+    examples_test.closure_averager_src,
+])
+def test_run_optimized(source: str) -> None:
+    assert run(source, optimize=True) == run(source)
@@ -0,0 +1,128 @@
+"""
+Profiler for programs run by the lis.py compiler.
+
+Code compiled inside a `profiling()` block is instrumented:
+each procedure body is timed under the name given by `define`
+(anonymous procedures are timed as `lambda`), and each special form
+under its keyword in brackets, like `[if]`. Code compiled outside
+the block has no hooks, so profiling costs nothing when not in use.
+A procedure that makes a tail call returns before the callee runs,
+so the callee's time is not counted as part of the caller's.
+
+>>> from lis import run
+>>> with profiling() as profiler:
+...     run('(define (sq x) (* x x)) (sq (sq 3))')
+81
+>>> profiler.stats['sq'].calls
+2
+
+Usage: python3 lisprof.py program.scm [collapsed_stacks.txt]
+"""
+
+import sys
+import time
+from collections import Counter
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from typing import Any, TextIO
+
+import lis
+from lis import Compiled, Frame
+
+
+class Stats:
+    "Counters for one procedure or special form."
+
+    __slots__ = ('calls', 'cumulative', 'self_time')
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.cumulative = 0.0  # seconds, counting nested calls once
+        self.self_time = 0.0  # seconds, not counting instrumented callees
+
+
+class Profiler:
+    "Collect call counts and timings from instrumented compiled code."
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self.clock = clock
+        self.stats: dict[str, Stats] = {}
+        self.collapsed: Counter[tuple[str, ...]] = Counter()
+        self.stack: list[str] = []
+        self.child_time: list[float] = []
+        self.active: Counter[str] = Counter()
+
+    def wrap(self, key: str, code: Compiled) -> Compiled:
+        "Return a closure that runs code and times it under key."
+        self.stats.setdefault(key, Stats())
+        clock = self.clock
+        def profiled(frame: Frame | None) -> Any:
+            self.enter(key)
+            start = clock()
+            try:
+                return code(frame)
+            finally:
+                self.exit(key, clock() - start)
+        return profiled
+
+    def enter(self, key: str) -> None:
+        self.stack.append(key)
+        self.child_time.append(0.0)
+        self.active[key] += 1
+
+    def exit(self, key: str, elapsed: float) -> None:
+        self_time = elapsed - self.child_time.pop()
+        stats = self.stats[key]
+        stats.calls += 1
+        stats.self_time += self_time
+        if self.active[key] == 1:  # outermost of recursive activations
+            stats.cumulative += elapsed
+        self.active[key] -= 1
+        self.collapsed[tuple(self.stack)] += self_time
+        self.stack.pop()
+        if self.child_time:
+            self.child_time[-1] += elapsed
+
+    def report(self, sort: str = 'cumulative', limit: int | None = None) -> str:
+        "Table of stats, sorted by 'calls', 'cumulative' or 'self_time'."
+        rows = sorted(self.stats.items(),
+                      key=lambda item: getattr(item[1], sort), reverse=True)
+        lines = [f'{"calls":>10} {"cumulative":>11} {"self":>11} '
+                 f'{"percall":>11}  name']
+        for key, stats in rows[:limit]:
+            if not stats.calls:
+                continue
+            percall = stats.cumulative / stats.calls
+            lines.append(f'{stats.calls:10d} {stats.cumulative:11.6f} '
+                         f'{stats.self_time:11.6f} {percall:11.6f}  {key}')
+        return '\n'.join(lines)
+
+    def write_collapsed(self, fp: TextIO) -> None:
+        """Write self time per call stack, in microseconds, in the
+        collapsed format read by flamegraph.pl and speedscope."""
+        for stack, seconds in sorted(self.collapsed.items()):
+            fp.write(f'{";".join(stack)} {round(seconds * 1_000_000)}\n')
+
+
+@contextmanager
+def profiling(profiler: Profiler | None = None) -> Iterator[Profiler]:
+    "Instrument code compiled in the with block for profiler."
+    if profiler is None:
+        profiler = Profiler()
+    previous, lis.PROFILER = lis.PROFILER, profiler
+    try:
+        yield profiler
+    finally:
+        lis.PROFILER = previous
+
+
+def main(args: list[str]) -> None:
+    with profiling() as profiler, open(args[0]) as fp:
+        lis.run(fp)
+    print(profiler.report())
+    if len(args) > 1:
+        with open(args[1], 'w') as out:
+            profiler.write_collapsed(out)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,70 @@
+import io
+from itertools import count
+
+import lis
+from lis import run
+from lisprof import Profiler, profiling
+
+
+fib_src = """
+(define (fib n)
+    (if (< n 2)
+        n
+        (+ (fib (- n 1)) (fib (- n 2)))))
+(fib 10)
+"""
+
+def test_call_counts() -> None:
+    with profiling() as profiler:
+        assert run(fib_src) == 55
+    assert profiler.stats['fib'].calls == 177
+    assert profiler.stats['[if]'].calls == 177
+    assert profiler.stats['[define]'].calls == 1
+
+
+def test_cumulative_and_self_time() -> None:
+    ticks = count()
+    profiler = Profiler(clock=lambda: next(ticks))
+    with profiling(profiler):
+        run('(define (f) (+ (g) 1)) (define (g) 1) (f)')
+    f, g = profiler.stats['f'], profiler.stats['g']
+    assert g.cumulative == g.self_time == 1
+    assert f.cumulative == 3  # its own start and end tick, and g's
+    assert f.self_time == f.cumulative - g.cumulative
+
+
+def test_recursion_counted_once_in_cumulative() -> None:
+    with profiling() as profiler:
+        run(fib_src)
+    fib = profiler.stats['fib']
+    assert fib.cumulative < fib.self_time + profiler.stats['[if]'].cumulative
+
+
+def test_anonymous_procedure() -> None:
+    with profiling() as profiler:
+        run('(map (lambda (x) x) (list 1 2 3))')
+    assert profiler.stats['lambda'].calls == 3
+
+
+def test_collapsed_stacks() -> None:
+    with profiling() as profiler:
+        run('(define (f) (+ (g) 1)) (define (g) 1) (f)')
+    out = io.StringIO()
+    profiler.write_collapsed(out)
+    stacks = [line.rsplit(' ', 1)[0] for line in out.getvalue().splitlines()]
+    assert stacks == ['[define]', 'f', 'f;g']
+
+
+def test_report_sorted() -> None:
+    with profiling() as profiler:
+        run(fib_src)
+    lines = profiler.report(sort='calls').splitlines()
+    assert lines[0].split() == ['calls', 'cumulative', 'self', 'percall', 'name']
+    assert lines[1].split()[-1] in ('fib', '[if]')
+
+
+def test_no_hooks_outside_profiling() -> None:
+    assert lis.PROFILER is None
+    with profiling():
+        assert lis.PROFILER is not None
+    assert lis.PROFILER is None
@@ -0,0 +1,300 @@
+"""
+A bytecode compiler and stack-based virtual machine for lis.py.
+
+`compile_code` translates an expression into a flat list of
+instructions; `execute_code` runs them in a dispatch loop.
+Calls between compiled procedures do not recurse in Python:
+the VM saves the caller's state in its own call stack, and a call
+in tail position reuses the caller's place in that stack.
+
+>>> from lis import parse, standard_env
+>>> print(disassemble(compile_code(parse('(if (< x 0) (- x) x)'), standard_env())))
+    0 LOAD_GLOBAL     '<'
+    1 LOAD_GLOBAL     'x'
+    2 CONST           0
+    3 CALL            2
+    4 JUMP_IF_FALSE   9
+    5 LOAD_GLOBAL     '-'
+    6 LOAD_GLOBAL     'x'
+    7 CALL            1
+    8 JUMP            10
+    9 LOAD_GLOBAL     'x'
+   10 RETURN
+"""
+
+from typing import Any, TypeAlias
+
+from lis import Symbol, Expression, Environment, Procedure, KEYWORDS
+from lis import Scope, Frame, UNASSIGNED
+from lis import definitions, global_scope, lexical_address, lispstr
+
+Instruction: TypeAlias = tuple[int, Any]
+
+################ Opcodes
+
+OPNAMES = [
+    'CONST',           # push arg
+    'LOAD_LOCAL',      # push frame[arg]
+    'LOAD_DEREF',      # push value at lexical address (depth, index, name)
+    'LOAD_GLOBAL',     # push global variable named arg
+    'DEFINE_LOCAL',    # pop value into frame[arg]; push None
+    'DEFINE_GLOBAL',   # pop value into global variable named arg; push None
+    'SET_DEREF',       # pop value into lexical address arg; push None
+    'SET_GLOBAL',      # pop value into existing global named arg; push None
+    'POP',             # discard top of stack
+    'JUMP',            # go to instruction arg
+    'JUMP_IF_FALSE',   # pop test; if it is false, go to instruction arg
+    'MAKE_CLOSURE',    # push a procedure running Code arg in this frame
+    'CALL',            # pop procedure and arg arguments; push result
+    'TAIL_CALL',       # CALL, reusing the current call stack entry
+    'RETURN',          # return top of stack to the caller
+]
+
+(CONST, LOAD_LOCAL, LOAD_DEREF, LOAD_GLOBAL, DEFINE_LOCAL, DEFINE_GLOBAL,
+ SET_DEREF, SET_GLOBAL, POP, JUMP, JUMP_IF_FALSE, MAKE_CLOSURE,
+ CALL, TAIL_CALL, RETURN) = range(len(OPNAMES))
+
+
+class Code:
+    "Instructions for a procedure body or a top-level expression."
+
+    def __init__(
+        self,
+        scope: Scope | Environment,
+        parms: list[Symbol] | None = None,
+        body: list[Expression] | None = None,
+    ):
+        self.instructions: list[Instruction] = []
+        self.scope = scope
+        self.global_env = global_scope(scope)
+        self.parms = parms or []
+        self.body = body or []
+        if isinstance(scope, Scope):
+            self.locals = (UNASSIGNED,) * (len(scope.names) - len(self.parms))
+
+    def emit(self, opcode: int, arg: Any = None) -> int:
+        "Append an instruction and return its position."
+        self.instructions.append((opcode, arg))
+        return len(self.instructions) - 1
+
+    def patch(self, position: int, target: int) -> None:
+        "Point the jump instruction at position to the target."
+        opcode, _ = self.instructions[position]
+        self.instructions[position] = (opcode, target)
+
+
+################ Compiler
+
+def compile_code(exp: Expression, scope: Scope | Environment) -> Code:
+    "Compile a top-level expression into bytecode."
+    code = Code(scope)
+    gen(exp, code, tail=False)
+    code.emit(RETURN)
+    return code
+
+def gen(exp: Expression, code: Code, tail: bool) -> None:
+    "Emit instructions that leave the value of exp on the stack."
+    scope = code.scope
+    match exp:
+        case int(x) | float(x):
+            code.emit(CONST, x)
+        case Symbol(var):
+            gen_ref(var, code)
+        case ['quote', x]:
+            code.emit(CONST, x)
+        case ['if', test, consequence, alternative]:
+            gen(test, code, tail=False)
+            jump_to_alternative = code.emit(JUMP_IF_FALSE)
+            gen(consequence, code, tail)
+            jump_to_end = code.emit(JUMP)
+            code.patch(jump_to_alternative, len(code.instructions))
+            gen(alternative, code, tail)
+            code.patch(jump_to_end, len(code.instructions))
+        case ['lambda', [*parms], *body] if body:
+            code.emit(MAKE_CLOSURE, gen_procedure(parms, body, scope))
+        case ['begin', *body] if body:
+            gen_sequence(body, code, tail)
+        case ['define', Symbol(name), value_exp]:
+            gen(value_exp, code, tail=False)
+            gen_define(name, code)
+        case ['define', [Symbol(name), *parms], *body] if body:
+            code.emit(MAKE_CLOSURE, gen_procedure(parms, body, scope))
+            gen_define(name, code)
+        case ['set!', Symbol(name), value_exp]:
+            gen(value_exp, code, tail=False)
+            address = lexical_address(name, scope)
+            if address is None:
+                code.emit(SET_GLOBAL, name)
+            else:
+                code.emit(SET_DEREF, (*address, name))
+        case [func_exp, *args] if func_exp not in KEYWORDS:
+            gen(func_exp, code, tail=False)
+            for arg in args:
+                gen(arg, code, tail=False)
+            code.emit(TAIL_CALL if tail else CALL, len(args))
+        case _:
+            raise SyntaxError(lispstr(exp))
+
+def gen_ref(var: Symbol, code: Code) -> None:
+    address = lexical_address(var, code.scope)
+    if address is None:
+        code.emit(LOAD_GLOBAL, var)
+    elif address[0] == 0:
+        code.emit(LOAD_LOCAL, address[1])
+    else:
+        code.emit(LOAD_DEREF, (*address, var))
+
+def gen_define(name: Symbol, code: Code) -> None:
+    if isinstance(code.scope, Scope):
+        code.emit(DEFINE_LOCAL, code.scope.index[name])
+    else:
+        code.emit(DEFINE_GLOBAL, name)
+
+def gen_sequence(body: list[Expression], code: Code, tail: bool) -> None:
+    *init, last = body
+    for exp in init:
+        gen(exp, code, tail=False)
+        code.emit(POP)
+    gen(last, code, tail)
+
+def gen_procedure(
+    parms: list[Symbol], body: list[Expression], scope: Scope | Environment
+) -> Code:
+    "Compile a procedure body into its own Code."
+    code = Code(Scope(parms, definitions(body), scope), parms, body)
+    gen_sequence(body, code, tail=True)
+    code.emit(RETURN)
+    return code
+
+
+################ Virtual machine
+
+class VMProcedure(Procedure):
+    "A user-defined Scheme procedure compiled to bytecode."
+
+    def __init__(self, code: Code, env: Frame | None):
+        super().__init__(code.parms, code.body, env)  # type: ignore[arg-type]
+        self.code = code
+        self.locals = code.locals
+
+    def make_frame(self, args: list[Any]) -> Frame:
+        if len(args) != len(self.parms):
+            raise TypeError(f'expected {lispstr(self.parms)}, '
+                            f'given {lispstr(list(args))}')
+        return [self.env, *args, *self.locals]
+
+    def __call__(self, *args: Any) -> Any:
+        return execute_code(self.code, self.make_frame(list(args)))
+
+
+def execute_code(code: Code, frame: Frame | None) -> Any:
+    "Run code in the dispatch loop until it returns to this call."
+    instructions = code.instructions
+    global_env = code.global_env
+    stack: list[Any] = []
+    calls: list[tuple[Code, int, Frame | None]] = []
+    pc = 0
+    while True:
+        opcode, arg = instructions[pc]
+        pc += 1
+        if opcode == LOAD_LOCAL:
+            value = frame[arg]  # type: ignore[index]
+            if value is UNASSIGNED:
+                raise KeyError(code.scope.names[arg - 1])  # type: ignore[union-attr]
+            stack.append(value)
+        elif opcode == LOAD_GLOBAL:
+            stack.append(global_env[arg])
+        elif opcode == CONST:
+            stack.append(arg)
+        elif opcode == CALL or opcode == TAIL_CALL:
+            if arg:
+                args = stack[-arg:]
+                del stack[-arg:]
+            else:
+                args = []
+            proc = stack.pop()
+            if type(proc) is VMProcedure:
+                if opcode == CALL:
+                    calls.append((code, pc, frame))
+                frame = proc.make_frame(args)
+                code = proc.code
+                instructions = code.instructions
+                global_env = code.global_env
+                pc = 0
+            else:
+                stack.append(proc(*args))
+        elif opcode == JUMP_IF_FALSE:
+            if not stack.pop():
+                pc = arg
+        elif opcode == RETURN:
+            if not calls:
+                return stack.pop()
+            code, pc, frame = calls.pop()
+            instructions = code.instructions
+            global_env = code.global_env
+        elif opcode == JUMP:
+            pc = arg
+        elif opcode == POP:
+            stack.pop()
+        elif opcode == LOAD_DEREF:
+            depth, index, name = arg
+            outer = frame
+            for _ in range(depth):
+                outer = outer[0]  # type: ignore[index]
+            value = outer[index]  # type: ignore[index]
+            if value is UNASSIGNED:
+                raise KeyError(name)
+            stack.append(value)
+        elif opcode == MAKE_CLOSURE:
+            stack.append(VMProcedure(arg, frame))
+        elif opcode == DEFINE_LOCAL:
+            frame[arg] = stack.pop()  # type: ignore[index]
+            stack.append(None)
+        elif opcode == DEFINE_GLOBAL:
+            global_env[arg] = stack.pop()
+            stack.append(None)
+        elif opcode == SET_DEREF:
+            depth, index, name = arg
+            outer = frame
+            for _ in range(depth):
+                outer = outer[0]  # type: ignore[index]
+            if outer[index] is UNASSIGNED:  # type: ignore[index]
+                raise KeyError(name)
+            outer[index] = stack.pop()  # type: ignore[index]
+            stack.append(None)
+        elif opcode == SET_GLOBAL:
+            global_env.change(arg, stack.pop())
+            stack.append(None)
+        else:
+            raise SystemError(f'unknown opcode: {opcode}')
+
+
+def execute(exp: Expression, env: Environment) -> Any:
+    "Compile an expression to bytecode and run it at the top level of env."
+    return execute_code(compile_code(exp, env), None)
+
+
+################ Disassembler
+
+def disassemble(code: Code, label: str = 'code') -> str:
+    "List the instructions of code, then those of the procedures it makes."
+    lines = []
+    nested: list[Code] = []
+    for position, (opcode, arg) in enumerate(code.instructions):
+        line = f'{position:5d} {OPNAMES[opcode]:<15}'
+        if opcode == MAKE_CLOSURE:
+            nested.append(arg)
+            line += f' <{label}.{len(nested)}: lambda {lispstr(arg.parms)}>'
+        elif opcode in (LOAD_DEREF, SET_DEREF):
+            depth, index, name = arg
+            line += f' {depth} {index} ({name})'
+        elif opcode == LOAD_LOCAL or opcode == DEFINE_LOCAL:
+            line += f' {arg} ({code.scope.names[arg - 1]})'  # type: ignore[union-attr]
+        elif arg is not None:
+            line += f' {arg!r}'
+        lines.append(line.rstrip())
+    for number, inner in enumerate(nested, 1):
+        inner_label = f'{label}.{number}'
+        lines.append(f'\n{inner_label}:')
+        lines.append(disassemble(inner, inner_label))
+    return '\n'.join(lines)
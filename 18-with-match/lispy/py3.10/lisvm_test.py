@@ -0,0 +1,75 @@
+from pytest import mark, raises
+
+from lis import parse, run, standard_env, Environment
+from lisvm import compile_code, disassemble, execute, VMProcedure
+
+import examples_test
+
+
+@mark.parametrize('source, expected', [
+    (examples_test.fact_src, 1405006117752879898543142606244511569936384000000000),
+    (examples_test.quicksort_src, [0, 1, 2, 3, 4, 5, 6, 7, 8, 9]),
+    (examples_test.closure_src, 100),
+    (examples_test.closure_averager_src, 12.0),
+])
+def test_run_vm(source: str, expected: object) -> None:
+    assert run(source, 'vm') == expected
+
+
+def test_closure_with_change(capsys) -> None:
+    run(examples_test.closure_with_change_src, 'vm')
+    captured = capsys.readouterr()
+    assert captured.out == '1\n2\n3\n'
+
+
+def test_builtin_calls_vm_procedure() -> None:
+    source = '(map (lambda (x) (* x x)) (list 1 2 3))'
+    assert run(source, 'vm') == [1, 4, 9]
+
+
+def test_tail_call_constant_stack() -> None:
+    source = """
+        (define (loop n acc)
+            (if (= n 0)
+                acc
+                (loop (- n 1) (+ acc 1))))
+        (loop 20000 0)
+        """
+    assert run(source, 'vm') == 20000
+
+
+def test_non_tail_calls_do_not_recurse_in_python() -> None:
+    source = """
+        (define (count n) (if (= n 0) 0 (+ 1 (count (- n 1)))))
+        (count 5000)
+        """
+    assert run(source, 'vm') == 5000
+
+
+def test_define_procedure() -> None:
+    env = Environment({}, standard_env())
+    execute(parse('(define (max a b) (if (>= a b) a b))'), env)
+    max_fn = env['max']
+    assert isinstance(max_fn, VMProcedure)
+    assert max_fn.parms == ['a', 'b']
+    assert max_fn(3, 2) == 3
+
+
+def test_arity_error() -> None:
+    with raises(TypeError):
+        run('((lambda (a b) a) 1)', 'vm')
+
+
+def test_disassemble_lambda() -> None:
+    code = compile_code(parse('(lambda (n) (* n 2))'), standard_env())
+    assert disassemble(code) == '\n'.join([
+        "    0 MAKE_CLOSURE    <code.1: lambda (n)>",
+        "    1 RETURN",
+        "",
+        "code.1:",
+        "    0 LOAD_GLOBAL     '*'",
+        "    1 LOAD_LOCAL      1 (n)",
+        "    2 CONST           2",
+        "    3 TAIL_CALL       2",
+        "    4 RETURN",
+    ])
@@ -9,11 +9,13 @@
 
 ################ Imports and Types
 
+import io
 import math
 import operator as op
 from collections import ChainMap
+from collections.abc import Iterable, Iterator
 from itertools import chain
-from typing import Any, Union, NoReturn
+from typing import Any, TextIO, Union, NoReturn
 
 Symbol = str
 Atom = Union[float, int, Symbol]
@@ -24,28 +26,38 @@ Expression = Union[Atom, list]
 
 def parse(program: str) -> Expression:
     "Read a Scheme expression from a string."
-    return read_from_tokens(tokenize(program))
+    return read_from_tokens(iter(tokenize(program)))
 
 def tokenize(s: str) -> list[str]:
     "Convert a string into a list of tokens."
     return s.replace('(', ' ( ').replace(')', ' ) ').split()
 
-def read_from_tokens(tokens: list[str]) -> Expression:
-    "Read an expression from a sequence of tokens."
-    if len(tokens) == 0:
-        raise SyntaxError('unexpected EOF while reading')
-    token = tokens.pop(0)
+def read_from_tokens(tokens: Iterator[str]) -> Expression:
+    "Read an expression from an iterator of tokens."
+    for token in tokens:
+        return read_expression(token, tokens)
+    raise SyntaxError('unexpected EOF while reading')
+
+def read_expression(token: str, tokens: Iterator[str]) -> Expression:
+    "Read an expression starting with token, consuming the rest from tokens."
     if '(' == token:
         exp = []
-        while tokens[0] != ')':
-            exp.append(read_from_tokens(tokens))
-        tokens.pop(0)  # discard ')'
-        return exp
+        for token in tokens:
+            if ')' == token:
+                return exp
+            exp.append(read_expression(token, tokens))
+        raise SyntaxError('unexpected EOF while reading')
     elif ')' == token:
         raise SyntaxError('unexpected )')
     else:
         return parse_atom(token)
 
+def read_forms(lines: Iterable[str]) -> Iterator[Expression]:
+    "Lazily read top-level expressions from lines of source code."
+    tokens = chain.from_iterable(map(tokenize, lines))
+    for token in tokens:
+        yield read_expression(token, tokens)
+
 def parse_atom(token: str) -> Atom:
     "Numbers become numbers; every other token is a symbol."
     try:
@@ -192,18 +204,20 @@ class Procedure:
 
 ################ command-line interface
 
-def run(source: str) -> Any:
+def run(source: Union[str, TextIO]) -> Any:
+    "Run a program given as a string or as a text file."
+    if isinstance(source, str):
+        source = io.StringIO(source)
     global_env = Environment({}, standard_env())
-    tokens = tokenize(source)
-    while tokens:
-        exp = read_from_tokens(tokens)
+    result = None
+    for exp in read_forms(source):
         result = evaluate(exp, global_env)
     return result
 
 def main(args: list[str]) -> None:
     if len(args) == 1:
         with open(args[0]) as fp:
-            run(fp.read())
+            run(fp)
     else:
         repl()
 
@@ -1,8 +1,10 @@
+import io
 from typing import Optional
 
-from pytest import mark, fixture
+from pytest import mark, fixture, raises
 
 from lis import parse, evaluate, Expression, Environment, standard_env
+from lis import read_forms, run
 
 ############################################################# tests for parse
 
@@ -19,6 +21,25 @@ def test_parse(source: str, expected: Expression) -> None:
     assert got == expected
 
 
+@mark.parametrize( 'source', ['', '(', '(a (b)', ')'])
+def test_parse_syntax_error(source: str) -> None:
+    with raises(SyntaxError):
+        parse(source)
+
+
+def test_read_forms() -> None:
+    lines = io.StringIO('(define x\n  (+ 1 2))\n(* x\n x) 7\n')
+    forms = read_forms(lines)
+    assert next(forms) == ['define', 'x', ['+', 1, 2]]
+    assert next(forms) == ['*', 'x', 'x']
+    assert list(forms) == [7]
+
+
+def test_run_file_object() -> None:
+    source = io.StringIO('(define (sq x) (* x x))\n(sq 12)\n')
+    assert run(source) == 144
+
+
 ########################################################## tests for evaluate
 
 # Norvig's tests are not isolated: they assume the
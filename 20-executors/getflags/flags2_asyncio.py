@@ -14,7 +14,8 @@ from pathlib import Path
 import httpx
 import tqdm  # type: ignore
 
-from flags2_common import main, DownloadStatus, save_flag
+from flags2_common import (main, DownloadStatus, save_flag, flag_cache,
+                           retry_policy, AsyncLimiter)
 
 # low concurrency default to avoid errors from remote site,
 # such as 503 - Service Temporarily Unavailable
@@ -23,20 +24,23 @@ MAX_CONCUR_REQ = 1000
 
 async def get_flag(client: httpx.AsyncClient,  # <1>
                    base_url: str,
-                   cc: str) -> bytes:
+                   cc: str) -> httpx.Response:
     url = f'{base_url}/{cc}/{cc}.gif'.lower()
-    resp = await client.get(url, timeout=3.1, follow_redirects=True)   # <2>
-    resp.raise_for_status()
-    return resp.content
+    headers = flag_cache.request_headers(url, f'{cc}.gif')
+    resp = await client.get(url, headers=headers,
+                            timeout=3.1, follow_redirects=True)   # <2>
+    if resp.status_code != HTTPStatus.NOT_MODIFIED:
+        resp.raise_for_status()
+    return resp
 
 async def download_one(client: httpx.AsyncClient,
                        cc: str,
                        base_url: str,
-                       semaphore: asyncio.Semaphore,
+                       limiter: AsyncLimiter,
                        verbose: bool) -> DownloadStatus:
     try:
-        async with semaphore:  # <3>
-            image = await get_flag(client, base_url, cc)
+        resp = await retry_policy.acall(get_flag, client, base_url, cc,
+                                        slot=limiter.slot)  # <3>
     except httpx.HTTPStatusError as exc:  # <4>
         res = exc.response
         if res.status_code == HTTPStatus.NOT_FOUND:
@@ -45,9 +49,14 @@ async def download_one(client: httpx.AsyncClient,
         else:
             raise
     else:
-        await asyncio.to_thread(save_flag, image, f'{cc}.gif')  # <5>
-        status = DownloadStatus.OK
-        msg = 'OK'
+        if resp.status_code == HTTPStatus.NOT_MODIFIED:
+            status = DownloadStatus.NOT_MODIFIED
+            msg = 'not modified'
+        else:
+            await asyncio.to_thread(save_flag, resp.content, f'{cc}.gif')  # <5>
+            flag_cache.record(resp, f'{cc}.gif')
+            status = DownloadStatus.OK
+            msg = 'OK'
     if verbose and msg:
         print(cc, msg)
     return status
@@ -59,9 +68,9 @@ async def supervisor(cc_list: list[str],
                      verbose: bool,
                      concur_req: int) -> Counter[DownloadStatus]:  # <1>
     counter: Counter[DownloadStatus] = Counter()
-    semaphore = asyncio.Semaphore(concur_req)  # <2>
+    limiter = AsyncLimiter(concur_req)  # <2>
     async with httpx.AsyncClient() as client:
-        to_do = [download_one(client, cc, base_url, semaphore, verbose)
+        to_do = [download_one(client, cc, base_url, limiter, verbose)
                  for cc in sorted(cc_list)]  # <3>
         to_do_iter = asyncio.as_completed(to_do)  # <4>
         if not verbose:
@@ -88,6 +97,7 @@ async def supervisor(cc_list: list[str],
                     print(f'{cc} error: {error_msg}')
             counter[status] += 1
 
+    print(limiter.report())
     return counter
 
 def download_many(cc_list: list[str],
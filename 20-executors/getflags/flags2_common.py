@@ -2,14 +2,26 @@
 """
 
 import argparse
+import asyncio
+import email.utils
+import hashlib
+import json
+import math
+import os
+import random
 import string
 import sys
+import threading
 import time
 from collections import Counter
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterator
+from contextlib import asynccontextmanager, contextmanager, nullcontext
 from enum import Enum
+from http import HTTPStatus
 from pathlib import Path
+from typing import Any, TypeVar
 
-DownloadStatus = Enum('DownloadStatus', 'OK NOT_FOUND ERROR')
+DownloadStatus = Enum('DownloadStatus', 'OK NOT_FOUND ERROR NOT_MODIFIED')
 
 POP20_CC = ('CN IN US ID BR PK NG BD RU JP '
             'MX PH VN ET EG DE IR TR CD FR').split()
@@ -27,12 +39,377 @@ DEFAULT_SERVER = 'REMOTE'
 
 DEST_DIR = Path('downloaded')
 COUNTRY_CODES_FILE = Path('country_codes.txt')
+CACHE_FILE = DEST_DIR / 'cache.json'
 
 
 def save_flag(img: bytes, filename: str) -> None:
     (DEST_DIR / filename).write_bytes(img)
 
 
+def file_hash(path: Path) -> str | None:
+    try:
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def valid_entry(entry: Any) -> bool:
+    "True if entry has the file name and hash of a flag, with any validators."
+    return (isinstance(entry, dict)
+            and all(isinstance(value, str) for value in entry.values())
+            and isinstance(entry.get('filename'), str)
+            and isinstance(entry.get('sha256'), str)
+            and Path(entry['filename']).name == entry['filename'])
+
+
+class FlagCache:
+    """Validators for the flags saved in DEST_DIR, by URL: the ETag and
+    Last-Modified headers, the file name and the SHA-256 hash of the file.
+    Requests for flags in the cache are conditional, so an unchanged
+    flag gets a 304 response with no body, and the file is not written.
+    """
+
+    def __init__(self) -> None:
+        self.entries: dict[str, dict[str, str]] = {}
+
+    def load(self, path: Path = CACHE_FILE) -> None:
+        """Read the cache, dropping entries for files changed or removed,
+        and any that are malformed: dropping one only costs a download."""
+        try:
+            entries = json.loads(path.read_text())
+        except (OSError, ValueError):
+            entries = {}
+        if not isinstance(entries, dict):
+            entries = {}
+        self.entries = {
+            url: entry for url, entry in entries.items()
+            if valid_entry(entry)
+            and file_hash(DEST_DIR / entry['filename']) == entry['sha256']
+        }
+
+    def save(self, path: Path = CACHE_FILE) -> None:
+        temp_path = path.with_suffix('.tmp')
+        temp_path.write_text(json.dumps(self.entries, indent=1))
+        os.replace(temp_path, path)
+
+    def request_headers(self, url: str, filename: str) -> dict[str, str]:
+        """Conditional request headers for url, if the cached response was
+        saved as filename: scripts that name the files differently
+        must not skip writing theirs."""
+        entry = self.entries.get(url, {})
+        headers: dict[str, str] = {}
+        if entry.get('filename') != filename:
+            return headers
+        if 'etag' in entry:
+            headers['If-None-Match'] = entry['etag']
+        if 'last_modified' in entry:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def record(self, resp: Any, filename: str) -> None:
+        "Save validators from resp, an HTTP response with the flag saved."
+        url = str(resp.history[0].url if resp.history else resp.url)
+        entry = {'filename': filename,
+                 'sha256': hashlib.sha256(resp.content).hexdigest()}
+        if etag := resp.headers.get('ETag'):
+            entry['etag'] = etag
+        if last_modified := resp.headers.get('Last-Modified'):
+            entry['last_modified'] = last_modified
+        self.entries[url] = entry
+
+
+flag_cache = FlagCache()
+
+
+def overloaded(exc: BaseException) -> bool:
+    "Any error but 404 may come from an overloaded server or network."
+    status = getattr(getattr(exc, 'response', None), 'status_code', None)
+    return status != HTTPStatus.NOT_FOUND
+
+
+class Trend:
+    """Short and long term exponentially weighted moving averages of a
+    signal. The first n values get weights of at least 1/n, so both
+    averages start as the plain mean."""
+
+    def __init__(self, short: float = 0.2, long: float = 0.02) -> None:
+        self.short_weight = short
+        self.long_weight = long
+        self.count = 0
+        self.short = self.long = 0.0
+
+    def update(self, value: float) -> None:
+        self.count += 1
+        self.short += max(self.short_weight, 1 / self.count) * (value - self.short)
+        self.long += max(self.long_weight, 1 / self.count) * (value - self.long)
+
+    def rising(self, ratio: float) -> bool:
+        "True if the recent average is above ratio times the long term one."
+        return self.short > self.long * ratio
+
+
+class AIMDLimit:
+    """Concurrency limit with additive increase and multiplicative decrease.
+
+    The limit starts at `minimum` and grows by one for each success, so it
+    doubles every round trip, until the first cut or latency increase.
+    Then it grows by about one every round trip while latency is flat:
+    while recent latency is within `tolerance` times the long term average.
+    Errors for which `overloaded` is true, including timeouts, multiply
+    the limit by `backoff` on the first one, which ends the doubling, and
+    later when the recent error rate is above `tolerance` times the long
+    term rate, so a server that always fails some requests does not keep
+    the limit down. Only requests started after the last cut can cause
+    another one.
+    """
+
+    def __init__(self, maximum: int, minimum: int = 1,
+                 backoff: float = 0.5, tolerance: float = 2.0,
+                 overloaded: Callable[[BaseException], bool] = overloaded,
+                 clock: Callable[[], float] = time.perf_counter) -> None:
+        self.maximum = maximum
+        self.minimum = minimum
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.overloaded = overloaded
+        self.clock = clock
+        self.limit = float(minimum)
+        self.in_flight = 0
+        self.slow_start = True
+        self.latency = Trend()
+        # errors are rarer than latency samples: average over more of them,
+        # so a steady error rate of a few percent does not look like a burst
+        self.errors = Trend(short=0.05, long=0.005)
+        self.last_cut = -math.inf
+        self.t0 = clock()
+        self.history: list[tuple[float, int]] = [(0.0, minimum)]
+
+    def can_start(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    def finish(self, start: float, exc: BaseException | None) -> None:
+        "Adjust the limit for a request that started at start."
+        self.in_flight -= 1
+        if exc is not None and not isinstance(exc, Exception):
+            return  # cancelled or interrupted: no news about the server
+        now = self.clock()
+        failed = exc is not None and self.overloaded(exc)
+        self.errors.update(failed)
+        if failed:
+            burst = self.slow_start or self.errors.rising(self.tolerance)
+            if start >= self.last_cut and burst:
+                self.slow_start = False
+                self.last_cut = now
+                self.set_limit(self.limit * self.backoff)
+            return
+        self.latency.update(now - start)
+        if self.latency.rising(self.tolerance):
+            self.slow_start = False
+        elif self.slow_start:
+            self.set_limit(self.limit + 1)
+        else:
+            self.set_limit(self.limit + 1 / self.limit)
+
+    def set_limit(self, limit: float) -> None:
+        limit = min(max(limit, self.minimum), self.maximum)
+        if int(limit) != int(self.limit):
+            self.history.append((self.clock() - self.t0, int(limit)))
+        self.limit = limit
+
+    def report(self, points: int = 12) -> str:
+        "Some changes of the limit, with the time since the start."
+        step = max(1, math.ceil(len(self.history) / points))
+        history = self.history[::step]
+        if history[-1] != self.history[-1]:
+            history.append(self.history[-1])
+        changes = ', '.join(f'{limit} at {t:.1f}s' for t, limit in history)
+        return f'Concurrency limit: {changes}.'
+
+
+class ThreadLimiter(AIMDLimit):
+    "AIMDLimit for threads: `with limiter.slot():` waits for a free slot."
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.condition = threading.Condition()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        with self.condition:
+            self.condition.wait_for(self.can_start)
+            self.in_flight += 1
+        start = self.clock()
+        error: BaseException | None = None
+        try:
+            yield
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            self.release(start, error)
+
+    def release(self, start: float, exc: BaseException | None) -> None:
+        with self.condition:
+            self.finish(start, exc)
+            self.condition.notify_all()
+
+
+class AsyncLimiter(AIMDLimit):
+    "AIMDLimit for coroutines: `async with limiter.slot():` replaces a Semaphore."
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.condition = asyncio.Condition()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        async with self.condition:
+            await self.condition.wait_for(self.can_start)
+            self.in_flight += 1
+        start = self.clock()
+        error: BaseException | None = None
+        try:
+            yield
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            await self.release(start, error)
+
+    async def release(self, start: float, exc: BaseException | None) -> None:
+        self.finish(start, exc)  # before any await, in case of cancellation
+        async with self.condition:
+            self.condition.notify_all()
+
+
+RETRY_STATUS = {
+    HTTPStatus.IM_A_TEAPOT,  # random errors from slow_server.py
+    HTTPStatus.TOO_MANY_REQUESTS,
+    HTTPStatus.INTERNAL_SERVER_ERROR,
+    HTTPStatus.BAD_GATEWAY,
+    HTTPStatus.SERVICE_UNAVAILABLE,
+    HTTPStatus.GATEWAY_TIMEOUT,
+}
+
+T = TypeVar('T')
+
+
+def retryable(exc: BaseException) -> bool:
+    "Errors without a response, like timeouts, and some status codes."
+    response = getattr(exc, 'response', None)
+    if response is None:
+        return hasattr(exc, 'request')  # httpx.RequestError
+    return response.status_code in RETRY_STATUS
+
+
+def retry_after(exc: BaseException) -> float | None:
+    "Seconds to wait given by a Retry-After header, if any."
+    response = getattr(exc, 'response', None)
+    value = None if response is None else response.headers.get('Retry-After')
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+class RetryPolicy:
+    """Retry failed requests after a delay with decorrelated jitter: a
+    random time from `base` to three times the previous delay, up to `cap`
+    seconds, unless the response has a Retry-After header. Each request
+    gets up to `attempts` tries. All retries together are limited to
+    `budget` times the number of requests, plus `min_retries`, so retries
+    cannot multiply the load on a server that is down.
+    """
+
+    def __init__(self, attempts: int = 3, base: float = 0.1, cap: float = 5.0,
+                 budget: float = 0.2, min_retries: int = 10,
+                 retryable: Callable[[BaseException], bool] = retryable) -> None:
+        self.attempts = attempts
+        self.base = base
+        self.cap = cap
+        self.budget = budget
+        self.min_retries = min_retries
+        self.retryable = retryable
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.recovered = 0
+
+    def next_delay(self, exc: Exception, attempt: int,
+                   delay: float) -> float | None:
+        "Seconds to wait before trying again, or None to give up."
+        if attempt >= self.attempts or not self.retryable(exc):
+            return None
+        wait = retry_after(exc)
+        if wait is None:
+            wait = min(self.cap, random.uniform(self.base, delay * 3))
+        elif wait > self.cap:
+            return None
+        with self.lock:
+            if self.retries >= self.min_retries + self.budget * self.requests:
+                return None
+            self.retries += 1
+        return wait
+
+    def start(self) -> None:
+        with self.lock:
+            self.requests += 1
+
+    def succeed(self, attempt: int) -> None:
+        if attempt > 1:
+            with self.lock:
+                self.recovered += 1
+
+    def call(self, func: Callable[..., T], *args: Any,
+             slot: Callable[[], Any] = nullcontext) -> T:
+        """Call func(*args), retrying on errors. Each try runs in a
+        `with slot():` block, so the delays do not hold a slot."""
+        self.start()
+        delay, attempt = self.base, 1
+        while True:
+            try:
+                with slot():
+                    result = func(*args)
+            except Exception as exc:
+                wait = self.next_delay(exc, attempt, delay)
+                if wait is None:
+                    raise
+                delay, attempt = max(wait, self.base), attempt + 1
+                time.sleep(wait)
+            else:
+                self.succeed(attempt)
+                return result
+
+    async def acall(self, func: Callable[..., Awaitable[T]], *args: Any,
+                    slot: Callable[[], Any] = nullcontext) -> T:
+        "Like call, for a coroutine function, with `async with slot():`."
+        self.start()
+        delay, attempt = self.base, 1
+        while True:
+            try:
+                async with slot():
+                    result = await func(*args)
+            except Exception as exc:
+                wait = self.next_delay(exc, attempt, delay)
+                if wait is None:
+                    raise
+                delay, attempt = max(wait, self.base), attempt + 1
+                await asyncio.sleep(wait)
+            else:
+                self.succeed(attempt)
+                return result
+
+
+retry_policy = RetryPolicy()
+
+
 def initial_report(cc_list: list[str],
                    actual_req: int,
                    server_label: str) -> None:
@@ -46,7 +423,7 @@ def initial_report(cc_list: list[str],
     if actual_req == 1:
         print('1 connection will be used.')
     else:
-        print(f'{actual_req} concurrent connections will be used.')
+        print(f'Up to {actual_req} concurrent connections will be used.')
 
 
 def final_report(cc_list: list[str],
@@ -56,11 +433,17 @@ def final_report(cc_list: list[str],
     print('-' * 20)
     plural = 's' if counter[DownloadStatus.OK] != 1 else ''
     print(f'{counter[DownloadStatus.OK]:3} flag{plural} downloaded.')
+    if counter[DownloadStatus.NOT_MODIFIED]:
+        print(f'{counter[DownloadStatus.NOT_MODIFIED]:3} not modified.')
     if counter[DownloadStatus.NOT_FOUND]:
         print(f'{counter[DownloadStatus.NOT_FOUND]:3} not found.')
     if counter[DownloadStatus.ERROR]:
         plural = 's' if counter[DownloadStatus.ERROR] != 1 else ''
         print(f'{counter[DownloadStatus.ERROR]:3} error{plural}.')
+    if retry_policy.retries:
+        plural = 'y' if retry_policy.retries == 1 else 'ies'
+        print(f'{retry_policy.retries:3} retr{plural}, '
+              f'{retry_policy.recovered} request(s) recovered.')
     print(f'Elapsed time: {elapsed:.2f}s')
 
 
@@ -150,8 +533,12 @@ def main(download_many, default_concur_req, max_concur_req):
     initial_report(cc_list, actual_req, args.server)
     base_url = SERVERS[args.server]
     DEST_DIR.mkdir(exist_ok=True)
+    flag_cache.load()
     t0 = time.perf_counter()
-    counter = download_many(cc_list, base_url, args.verbose, actual_req)
+    try:
+        counter = download_many(cc_list, base_url, args.verbose, actual_req)
+    finally:
+        flag_cache.save()
     final_report(cc_list, counter, t0)
-    
+
 
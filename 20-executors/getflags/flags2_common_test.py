@@ -0,0 +1,244 @@
+import asyncio
+import email.utils
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from flags2_common import AIMDLimit, AsyncLimiter, ThreadLimiter, RetryPolicy
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class HTTPError(Exception):
+    "Like httpx.HTTPStatusError: the response has the status code."
+
+    def __init__(self, status_code: int, headers: dict | None = None) -> None:
+        super().__init__(status_code)
+        self.response = SimpleNamespace(status_code=status_code,
+                                        headers=headers or {})
+
+
+class NetworkError(Exception):
+    "Like httpx.RequestError: no response, but the request."
+
+    request = None
+
+
+def failing(*errors):
+    "Function raising errors in turn, then returning the number of calls."
+    calls = []
+
+    def func():
+        calls.append(None)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return len(calls)
+
+    func.calls = calls
+    return func
+
+
+def run_round(limit, clock, error=None):
+    "Start as many requests as the limit allows, all done a second later."
+    starts = []
+    while limit.can_start():
+        limit.in_flight += 1
+        starts.append(clock())
+    clock.now += 1
+    for start in starts:
+        limit.finish(start, error)
+    return len(starts)
+
+
+def test_slow_start_doubles_every_round_trip():
+    clock = FakeClock()
+    limit = AIMDLimit(100, clock=clock)
+    sizes = [run_round(limit, clock) for _ in range(6)]
+    assert sizes == [1, 2, 4, 8, 16, 32]
+    assert limit.limit == 64
+
+
+def test_limit_stays_within_bounds():
+    limit = AIMDLimit(10, minimum=2, clock=FakeClock())
+    limit.set_limit(100)
+    assert limit.limit == 10
+    limit.set_limit(0.5)
+    assert limit.limit == 2
+
+
+def test_first_error_ends_slow_start():
+    clock = FakeClock()
+    limit = AIMDLimit(100, clock=clock)
+    for _ in range(5):
+        run_round(limit, clock)
+    assert limit.limit == 32
+    assert run_round(limit, clock, HTTPError(503)) == 32
+    assert limit.limit == 16  # only one cut: all started before it
+    assert not limit.slow_start
+
+
+def test_error_burst_cuts_every_round_trip():
+    clock = FakeClock()
+    limit = AIMDLimit(100, clock=clock)
+    run_round(limit, clock, HTTPError(503))
+    for _ in range(300):
+        run_round(limit, clock)
+    before = limit.limit
+    assert before > 16
+    run_round(limit, clock, HTTPError(503))
+    assert limit.limit == before / 2
+    run_round(limit, clock, HTTPError(503))
+    assert limit.limit == before / 4
+
+
+def test_no_cut_at_constant_error_rate():
+    clock = FakeClock()
+    limit = AIMDLimit(100, clock=clock)
+    limits = []
+    for i in range(2000):  # one error in ten
+        limit.in_flight += 1
+        start = clock()
+        clock.now += 1
+        limit.finish(start, HTTPError(503) if i % 10 == 9 else None)
+        limits.append(limit.limit)
+    assert limits[:10] == [2, 3, 4, 5, 6, 7, 8, 9, 10, 5]  # first error
+    assert limits[9:] == sorted(limits[9:])  # no other cut
+    assert limit.limit > 50
+
+
+def test_no_cut_on_not_found():
+    clock = FakeClock()
+    limit = AIMDLimit(100, clock=clock)
+    sizes = [run_round(limit, clock, HTTPError(404)) for _ in range(4)]
+    assert sizes == [1, 2, 4, 8]
+
+
+def test_latency_increase_ends_slow_start():
+    clock = FakeClock()
+    limit = AIMDLimit(100, clock=clock)
+    for _ in range(5):
+        run_round(limit, clock)
+    limit.in_flight += 1
+    start = clock()
+    clock.now += 10
+    limit.finish(start, None)
+    assert not limit.slow_start
+    assert limit.limit == 32
+
+
+def test_thread_limiter_interrupted():
+    limiter = ThreadLimiter(10, clock=FakeClock())
+    with pytest.raises(KeyboardInterrupt):
+        with limiter.slot():
+            assert limiter.in_flight == 1
+            raise KeyboardInterrupt
+    assert limiter.in_flight == 0
+    assert limiter.limit == 1
+    assert limiter.errors.count == 0
+
+
+def test_async_limiter_cancelled():
+    limiter = AsyncLimiter(10, clock=FakeClock())
+
+    async def request(started):
+        async with limiter.slot():
+            started.set()
+            await asyncio.sleep(10)
+
+    async def cancel_request():
+        started = asyncio.Event()
+        task = asyncio.create_task(request(started))
+        await started.wait()
+        assert limiter.in_flight == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_request())
+    assert limiter.in_flight == 0
+    assert limiter.limit == 1
+    assert limiter.errors.count == 0
+
+
+def test_retry_until_attempts():
+    policy = RetryPolicy(attempts=3, base=0, cap=0)
+    func = failing(*[HTTPError(503)] * 5)
+    with pytest.raises(HTTPError):
+        policy.call(func)
+    assert len(func.calls) == 3
+    assert (policy.retries, policy.recovered) == (2, 0)
+
+
+def test_retry_budget():
+    policy = RetryPolicy(attempts=10, base=0, cap=0, budget=0.5, min_retries=1)
+    for calls in [3, 1, 2, 1]:  # retries while retries < 1 + requests / 2
+        func = failing(*[HTTPError(503)] * 10)
+        with pytest.raises(HTTPError):
+            policy.call(func)
+        assert len(func.calls) == calls
+    assert (policy.requests, policy.retries) == (4, 3)
+
+
+def test_retry_after_seconds():
+    policy = RetryPolicy(cap=5)
+    assert policy.next_delay(HTTPError(503, {'Retry-After': '2'}), 1, 0.1) == 2
+
+
+def test_retry_after_date():
+    policy = RetryPolicy(cap=5)
+    date = email.utils.formatdate(time.time() + 3, usegmt=True)
+    delay = policy.next_delay(HTTPError(429, {'Retry-After': date}), 1, 0.1)
+    assert 1 < delay <= 3
+
+
+def test_retry_after_above_cap_gives_up():
+    policy = RetryPolicy(cap=5)
+    error = HTTPError(503, {'Retry-After': '60'})
+    assert policy.next_delay(error, 1, 0.1) is None
+    assert policy.retries == 0
+
+
+def test_retry_after_invalid_uses_backoff():
+    policy = RetryPolicy(base=0.1, cap=5)
+    error = HTTPError(503, {'Retry-After': 'soon'})
+    assert 0.1 <= policy.next_delay(error, 1, 0.1) <= 0.3
+
+
+@pytest.mark.parametrize('error', [HTTPError(404), ValueError('bug')])
+def test_no_retry(error):
+    policy = RetryPolicy(base=0, cap=0)
+    func = failing(error)
+    with pytest.raises(type(error)):
+        policy.call(func)
+    assert len(func.calls) == 1
+    assert policy.retries == 0
+
+
+def test_retry_network_error():
+    policy = RetryPolicy(base=0, cap=0)
+    assert policy.call(failing(NetworkError())) == 2
+
+
+def test_recovered():
+    policy = RetryPolicy(base=0, cap=0)
+    assert policy.call(failing()) == 1
+    assert policy.call(failing(HTTPError(503), HTTPError(502))) == 3
+    assert (policy.requests, policy.retries, policy.recovered) == (2, 2, 1)
+
+
+def test_async_recovered():
+    policy = RetryPolicy(base=0, cap=0)
+    func = failing(HTTPError(503))
+
+    async def coro_func():
+        return func()
+
+    assert asyncio.run(policy.acall(coro_func)) == 2
+    assert (policy.retries, policy.recovered) == (1, 1)
@@ -19,25 +19,32 @@ Sample run::
 
 # tag::FLAGS2_BASIC_HTTP_FUNCTIONS[]
 from collections import Counter
+from collections.abc import Callable
+from contextlib import nullcontext
 from http import HTTPStatus
+from typing import Any
 
 import httpx
 import tqdm  # type: ignore  # <1>
 
-from flags2_common import main, save_flag, DownloadStatus  # <2>
+from flags2_common import (main, save_flag, flag_cache, retry_policy,
+                           DownloadStatus)  # <2>
 
 DEFAULT_CONCUR_REQ = 1
 MAX_CONCUR_REQ = 1
 
-def get_flag(base_url: str, cc: str) -> bytes:
+def get_flag(base_url: str, cc: str) -> httpx.Response:
     url = f'{base_url}/{cc}/{cc}.gif'.lower()
-    resp = httpx.get(url, timeout=3.1, follow_redirects=True)
-    resp.raise_for_status()  # <3>
-    return resp.content
-
-def download_one(cc: str, base_url: str, verbose: bool = False) -> DownloadStatus:
+    headers = flag_cache.request_headers(url, f'{cc}.gif')
+    resp = httpx.get(url, headers=headers, timeout=3.1, follow_redirects=True)
+    if resp.status_code != HTTPStatus.NOT_MODIFIED:
+        resp.raise_for_status()  # <3>
+    return resp
+
+def download_one(cc: str, base_url: str, verbose: bool = False,
+                 slot: Callable[[], Any] = nullcontext) -> DownloadStatus:
     try:
-        image = get_flag(base_url, cc)
+        resp = retry_policy.call(get_flag, base_url, cc, slot=slot)
     except httpx.HTTPStatusError as exc:  # <4>
         res = exc.response
         if res.status_code == HTTPStatus.NOT_FOUND:
@@ -46,9 +53,14 @@ def download_one(cc: str, base_url: str, verbose: bool = False) -> DownloadStatu
         else:
             raise  # <6>
     else:
-        save_flag(image, f'{cc}.gif')
-        status = DownloadStatus.OK
-        msg = 'OK'
+        if resp.status_code == HTTPStatus.NOT_MODIFIED:
+            status = DownloadStatus.NOT_MODIFIED
+            msg = 'not modified'
+        else:
+            save_flag(resp.content, f'{cc}.gif')
+            flag_cache.record(resp, f'{cc}.gif')
+            status = DownloadStatus.OK
+            msg = 'OK'
 
     if verbose:  # <7>
         print(cc, msg)
@@ -9,7 +9,7 @@ Sample run::
     $ python3 flags2_threadpool.py -s ERROR -e
     ERROR site: http://localhost:8003/flags
     Searching for 676 flags: from AA to ZZ
-    30 concurrent connections will be used.
+    Up to 30 concurrent connections will be used.
     --------------------
     150 flags downloaded.
     361 not found.
@@ -25,7 +25,7 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 import httpx
 import tqdm  # type: ignore
 
-from flags2_common import main, DownloadStatus
+from flags2_common import main, DownloadStatus, ThreadLimiter
 from flags2_sequential import download_one  # <1>
 
 DEFAULT_CONCUR_REQ = 30  # <2>
@@ -37,11 +37,12 @@ def download_many(cc_list: list[str],
                     verbose: bool,
                     concur_req: int) -> Counter[DownloadStatus]:
     counter: Counter[DownloadStatus] = Counter()
+    limiter = ThreadLimiter(concur_req)
     with ThreadPoolExecutor(max_workers=concur_req) as executor:  # <4>
         to_do_map = {}  # <5>
         for cc in sorted(cc_list):  # <6>
-            future = executor.submit(download_one, cc,
-                                        base_url, verbose)  # <7>
+            future = executor.submit(download_one, cc, base_url,
+                                        verbose, limiter.slot)  # <7>
             to_do_map[future] = cc  # <8>
         done_iter = as_completed(to_do_map)  # <9>
         if not verbose:
@@ -66,6 +67,7 @@ def download_many(cc_list: list[str],
                 cc = to_do_map[future]  # <14>
                 print(f'{cc} error: {error_msg}')
 
+    print(limiter.report())
     return counter
 
 
@@ -14,7 +14,8 @@ from pathlib import Path
 import httpx
 import tqdm  # type: ignore
 
-from flags2_common import main, DownloadStatus, save_flag
+from flags2_common import (main, DownloadStatus, save_flag, flag_cache,
+                           retry_policy, AsyncLimiter)
 
 # low concurrency default to avoid errors from remote site,
 # such as 503 - Service Temporarily Unavailable
@@ -23,11 +24,15 @@ MAX_CONCUR_REQ = 1000
 
 async def get_flag(client: httpx.AsyncClient,  # <1>
                    base_url: str,
-                   cc: str) -> bytes:
+                   cc: str,
+                   filename: str) -> httpx.Response:
     url = f'{base_url}/{cc}/{cc}.gif'.lower()
-    resp = await client.get(url, timeout=3.1, follow_redirects=True)   # <2>
-    resp.raise_for_status()
-    return resp.content
+    headers = flag_cache.request_headers(url, filename)
+    resp = await client.get(url, headers=headers,
+                            timeout=3.1, follow_redirects=True)   # <2>
+    if resp.status_code != HTTPStatus.NOT_MODIFIED:
+        resp.raise_for_status()
+    return resp
 
 # tag::FLAGS3_ASYNCIO_GET_COUNTRY[]
 async def get_country(client: httpx.AsyncClient,
@@ -44,13 +49,14 @@ async def get_country(client: httpx.AsyncClient,
 async def download_one(client: httpx.AsyncClient,
                        cc: str,
                        base_url: str,
-                       semaphore: asyncio.Semaphore,
+                       limiter: AsyncLimiter,
                        verbose: bool) -> DownloadStatus:
     try:
-        async with semaphore:  # <1>
-            image = await get_flag(client, base_url, cc)
-        async with semaphore:  # <2>
-            country = await get_country(client, base_url, cc)
+        country = await retry_policy.acall(get_country, client, base_url,
+                                           cc, slot=limiter.slot)  # <1>
+        filename = f"{country.replace(' ', '_')}.gif"  # <2>
+        resp = await retry_policy.acall(get_flag, client, base_url, cc,
+                                        filename, slot=limiter.slot)  # <3>
     except httpx.HTTPStatusError as exc:
         res = exc.response
         if res.status_code == HTTPStatus.NOT_FOUND:
@@ -59,10 +65,14 @@ async def download_one(client: httpx.AsyncClient,
         else:
             raise
     else:
-        filename = country.replace(' ', '_')  # <3>
-        await asyncio.to_thread(save_flag, image, f'{filename}.gif')
-        status = DownloadStatus.OK
-        msg = 'OK'
+        if resp.status_code == HTTPStatus.NOT_MODIFIED:
+            status = DownloadStatus.NOT_MODIFIED
+            msg = 'not modified'
+        else:
+            await asyncio.to_thread(save_flag, resp.content, filename)
+            flag_cache.record(resp, filename)
+            status = DownloadStatus.OK
+            msg = 'OK'
     if verbose and msg:
         print(cc, msg)
     return status
@@ -74,9 +84,9 @@ async def supervisor(cc_list: list[str],
                         verbose: bool,
                         concur_req: int) -> Counter[DownloadStatus]:  # <1>
     counter: Counter[DownloadStatus] = Counter()
-    semaphore = asyncio.Semaphore(concur_req)  # <2>
+    limiter = AsyncLimiter(concur_req)  # <2>
     async with httpx.AsyncClient() as client:
-        to_do = [download_one(client, cc, base_url, semaphore, verbose)
+        to_do = [download_one(client, cc, base_url, limiter, verbose)
                     for cc in sorted(cc_list)]  # <3>
         to_do_iter = asyncio.as_completed(to_do)  # <4>
         if not verbose:
@@ -103,6 +113,7 @@ async def supervisor(cc_list: list[str],
                     print(f'{cc} error: {error_msg}')
             counter[status] += 1
 
+    print(limiter.report())
     return counter
 
 def download_many(cc_list: list[str],
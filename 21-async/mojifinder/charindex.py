@@ -27,18 +27,132 @@ words, and returns the intersection of the entries for each word::
     >>> idx.search('capital a')
     {'A'}
 
+The ``mode`` argument of ``.search()`` changes how query words match
+words in the index: ``'prefix'`` matches words that start with each
+query word, for type-ahead; ``'fuzzy'`` also matches words one typo
+away, i.e. one letter inserted, deleted, replaced or swapped::
+
+    >>> sorted(idx.search('dol', mode='prefix'))
+    ['$']
+    >>> sorted(idx.search('dolar sign', mode='fuzzy'))
+    ['$']
+
+``.search_page()`` returns the most relevant results first, one page
+at a time, and the total number of results::
+
+    >>> idx.search_page('sign', limit=3)
+    Page(chars=['#', '$', '%'], total=7)
+    >>> idx.search_page('sign', offset=6, limit=3)
+    Page(chars=['>'], total=7)
+
+Repeated words do not change the ranking, just as they do not change
+the key of cached results (see ``query_key`` below)::
+
+    >>> latin = InvertedIndex(32, 0x300)
+    >>> latin.search_page('letter letter small', limit=3)
+    Page(chars=['a', 'b', 'c'], total=320)
+
+When the Unicode database changes, ``diff_names`` finds the characters
+added, removed and renamed, and ``.apply()`` updates an index with
+them, without indexing all names again. ``.add_aliases()`` adds extra
+words for some characters, such as CLDR short names::
+
+    >>> idx.apply(diff_names({36: 'DOLLAR SIGN'},
+    ...                      {36: 'PESO SIGN', 0x1F600: 'GRINNING FACE'}))
+    >>> idx.search('peso'), idx.search('dollar'), idx.search('grinning face')
+    ({'$'}, set(), {'😀'})
+    >>> idx.add_aliases({'😀': 'smile', '$': 'money'})
+    >>> idx.search('smile'), idx.search('money sign')
+    ({'😀'}, {'$'})
+
+Names from a newer database may be missing from the ``unicodedata`` of
+the running Python, so ``format_line`` leaves them blank::
+
+    >>> idx.apply(diff_names({}, {0xE000: 'CUSTOM GLYPH'}))
+    >>> [format_line(char) for char in idx.search('custom glyph')]
+    ['U+E000\\t\\ue000\\t']
+
+Building the index for all of Unicode takes about a second.
+``save_index`` writes an index to a compact file, and ``MappedIndex``
+searches that file through ``mmap``, so processes using the same file
+share its pages. ``load_index`` maps the file for the Unicode version
+of the running Python, building and saving it first if needed::
+
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as tmp:
+    ...     path = f'{tmp}/ascii.idx'
+    ...     save_index(idx, path)
+    ...     mapped = MappedIndex(path)
+    ...     mapped.search('capital a'), sorted(mapped.search('sign'))[:3]
+    ({'A'}, ['#', '$', '%'])
+
+Servers keep encoded responses in a ``QueryCache``, keyed by
+``query_key``, which ignores case, word order and repeated words::
+
+    >>> cache = QueryCache(maxsize=2)
+    >>> key = query_key('Cat face')
+    >>> key == query_key('FACE cat cat')
+    True
+    >>> cache.get(key) is None
+    True
+    >>> cache.put(key, b'U+1F431 CAT FACE')
+    >>> cache.get(key)
+    b'U+1F431 CAT FACE'
+    >>> cache.cache_info()
+    CacheInfo(hits=1, misses=1, maxsize=2, currsize=1)
+
 """
 
+import bisect
+import contextlib
+import heapq
+import mmap
+import os
+import struct
 import sys
+import time
 import unicodedata
-from collections import defaultdict
-from collections.abc import Iterator
+import warnings
+from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict, defaultdict
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from functools import cached_property
+from pathlib import Path
+from typing import Any, Callable, NamedTuple, Protocol
 
 STOP_CODE: int = sys.maxunicode + 1
 
 Char = str
 Index = defaultdict[str, set[Char]]
 
+INDEX_DIR = Path(os.environ.get('MOJIFINDER_INDEX_DIR', Path(__file__).parent))
+INDEX_MAGIC = b'MOJI'
+INDEX_FORMAT = 1
+# magic, format, Unicode version, word count, posting count; native byte order
+INDEX_HEADER = struct.Struct('=4sI16sII')
+
+SEARCH_MODES = ('word', 'prefix', 'fuzzy')
+FUZZY_MIN_LENGTH = 3  # shorter words have too many neighbors to be useful
+PAGE_SIZE = 100
+CHUNKS_PER_WORKER = 4  # names are denser in some ranges, so split finer
+
+# (first, last) code points of the blocks users search most, in that order
+POPULAR_BLOCKS = [
+    (0x1F600, 0x1F64F),  # Emoticons
+    (0x1F300, 0x1F5FF),  # Miscellaneous Symbols and Pictographs
+    (0x1F900, 0x1F9FF),  # Supplemental Symbols and Pictographs
+    (0x1F680, 0x1F6FF),  # Transport and Map Symbols
+    (0x2600, 0x26FF),  # Miscellaneous Symbols
+    (0x2700, 0x27BF),  # Dingbats
+    (0x2190, 0x21FF),  # Arrows
+    (0x25A0, 0x25FF),  # Geometric Shapes
+    (0x2200, 0x22FF),  # Mathematical Operators
+    (0x0020, 0x007F),  # Basic Latin
+    (0x00A0, 0x00FF),  # Latin-1 Supplement
+]
+
 
 def tokenize(text: str) -> Iterator[str]:
     """return iterator of uppercased words"""
@@ -46,7 +160,176 @@ def tokenize(text: str) -> Iterator[str]:
         yield word
 
 
-class InvertedIndex:
+def deletions(word: str) -> Iterator[str]:
+    "Yield word with each one of its letters deleted."
+    for i in range(len(word)):
+        yield word[:i] + word[i + 1:]
+
+
+def one_edit_apart(a: str, b: str) -> bool:
+    """True if a and b are equal, or differ by one letter inserted,
+    deleted or replaced, or by two adjacent letters swapped."""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    i = 0
+    while i < min(len(a), len(b)) and a[i] == b[i]:
+        i += 1
+    if len(a) < len(b):
+        a, b = b, a
+    if len(a) > len(b):
+        return a[i + 1:] == b[i:]
+    return a[i + 1:] == b[i + 1:] or (
+        a[i:i + 2] == b[i:i + 2][::-1] and a[i + 2:] == b[i + 2:])
+
+
+class Vocabulary:
+    "Sorted words of an index, to find words to search for each query word."
+
+    def __init__(self, words: Sequence[str]):
+        self.words = words
+
+    def prefixed(self, prefix: str) -> list[str]:
+        "Words starting with prefix."
+        lo = bisect.bisect_left(self.words, prefix)  # type: ignore[arg-type]
+        hi = bisect.bisect_left(self.words, prefix + '\uffff', lo)  # type: ignore
+        return [self.words[i] for i in range(lo, hi)]
+
+    def __contains__(self, word: str) -> bool:
+        i = bisect.bisect_left(self.words, word)  # type: ignore[arg-type]
+        return i < len(self.words) and self.words[i] == word
+
+    @cached_property
+    def deletion_index(self) -> dict[str, list[str]]:
+        """Map each word, and each deletion of one of its letters,
+        to the words it comes from. Words with digits are left out:
+        they are parts of code points and numbers, not typos."""
+        index: defaultdict[str, list[str]] = defaultdict(list)
+        for word in self.words:
+            if len(word) >= FUZZY_MIN_LENGTH and word.isalpha():
+                index[word].append(word)
+                for key in set(deletions(word)):
+                    index[key].append(word)
+        return dict(index)
+
+    def similar(self, word: str) -> list[str]:
+        "Words at most one typo away from word."
+        found = {word} if word in self else set()
+        if len(word) >= FUZZY_MIN_LENGTH:
+            # words one edit apart share a key: themselves or a deletion
+            for key in (word, *deletions(word)):
+                for candidate in self.deletion_index.get(key, ()):
+                    if one_edit_apart(word, candidate):
+                        found.add(candidate)
+        return sorted(found)
+
+    def expand(self, word: str, mode: str = 'word') -> list[str]:
+        "Words to search for word, according to the search mode."
+        if mode == 'word':
+            return [word]
+        elif mode == 'prefix':
+            return self.prefixed(word)
+        elif mode == 'fuzzy':
+            return self.similar(word)
+        raise ValueError(f'unknown search mode: {mode!r}')
+
+
+def block_rank(code: int) -> int:
+    "Position of the block of code in POPULAR_BLOCKS, or after all of them."
+    for rank, (first, last) in enumerate(POPULAR_BLOCKS):
+        if first <= code <= last:
+            return rank
+    return len(POPULAR_BLOCKS)
+
+
+def relevance(char: Char, words: list[str]) -> tuple[int, int, int]:
+    """Score for sorting search results, lowest first. Characters rank
+    higher with query words near the start of their names, then with
+    fewer words in their names, then in more popular blocks."""
+    name_words = unicodedata.name(char, '').replace('-', ' ').split()
+    position = sum(name_words.index(w) if w in name_words else len(name_words)
+                   for w in words)
+    return position, len(name_words), block_rank(ord(char))
+
+
+class Page(NamedTuple):
+    chars: list[Char]
+    total: int
+
+
+class RankingMixin:
+    "Add ranked, paginated search to an index with a search method."
+
+    def search_page(self, query: str, mode: str = 'word', offset: int = 0,
+                    limit: int = PAGE_SIZE) -> Page:
+        """Results offset to offset+limit, in order of relevance.
+        Only those are sorted, selected with a heap."""
+        chars = self.search(query, mode)  # type: ignore[attr-defined]
+        words = list(dict.fromkeys(tokenize(query)))  # unique, as in query_key
+        top = heapq.nsmallest(offset + limit, chars,
+                              key=lambda char: (*relevance(char, words), char))
+        return Page(top[offset:], len(chars))
+
+
+class NameDelta(NamedTuple):
+    added: dict[int, str]
+    removed: dict[int, str]
+    renamed: dict[int, tuple[str, str]]  # old and new names
+
+
+def character_names(database: Any = unicodedata,
+                    start: int = 32, stop: int = STOP_CODE) -> dict[int, str]:
+    """Names by code point, from ``unicodedata`` or an object with the
+    same ``name`` function, like ``unicodedata.ucd_3_2_0``."""
+    names = {}
+    for code in range(start, stop):
+        if name := database.name(chr(code), ''):
+            names[code] = name
+    return names
+
+
+def diff_names(old: Mapping[int, str], new: Mapping[int, str]) -> NameDelta:
+    "Changes from the old to the new names, both keyed by code point."
+    added = {code: name for code, name in new.items() if code not in old}
+    removed = {code: name for code, name in old.items() if code not in new}
+    renamed = {code: (old[code], name) for code, name in new.items()
+               if code in old and old[code] != name}
+    return NameDelta(added, removed, renamed)
+
+
+def word_changes(delta: NameDelta) -> Iterator[tuple[int, set[str], set[str]]]:
+    "Yield each changed code point, with the words it loses and gains."
+    for code, name in delta.removed.items():
+        yield code, set(tokenize(name)), set()
+    for code, name in delta.added.items():
+        yield code, set(), set(tokenize(name))
+    for code, (old_name, new_name) in delta.renamed.items():
+        old_words, new_words = set(tokenize(old_name)), set(tokenize(new_name))
+        yield code, old_words - new_words, new_words - old_words
+
+
+class UpdateMixin:
+    "Add incremental updates to an index with add_code and remove_code."
+
+    def apply(self, delta: NameDelta) -> None:
+        "Update the entries for names added, removed or renamed."
+        for code, lost, gained in word_changes(delta):
+            for word in lost:
+                self.remove_code(word, code)  # type: ignore[attr-defined]
+            for word in gained:
+                self.add_code(word, code)  # type: ignore[attr-defined]
+        self.__dict__.pop('vocabulary', None)  # cached words are outdated
+
+    def add_aliases(self, aliases: Mapping[Char, str]) -> None:
+        "Index each character under the words of its alias, too."
+        for char, alias in aliases.items():
+            for word in tokenize(alias):
+                self.add_code(word, ord(char))  # type: ignore[attr-defined]
+        self.__dict__.pop('vocabulary', None)
+
+
+class InvertedIndex(RankingMixin, UpdateMixin):
     entries: Index
 
     def __init__(self, start: int = 32, stop: int = STOP_CODE):
@@ -58,26 +341,452 @@ class InvertedIndex:
                     entries[word].add(char)
         self.entries = entries
 
-    def search(self, query: str) -> set[Char]:
+    @cached_property
+    def vocabulary(self) -> Vocabulary:
+        return Vocabulary(sorted(self.entries))
+
+    def posting_size(self, word: str) -> int:
+        return len(self.entries.get(word, ()))
+
+    def add_code(self, word: str, code: int) -> None:
+        self.entries[word].add(chr(code))
+
+    def remove_code(self, word: str, code: int) -> None:
+        if chars := self.entries.get(word):
+            chars.discard(chr(code))
+            if not chars:
+                del self.entries[word]
+
+    def code_points(self, word: str) -> list[int]:
+        return sorted(ord(char) for char in self.entries.get(word, ()))
+
+    def lookup(self, word: str, mode: str = 'word') -> set[Char]:
+        "Characters with word in their names, matched according to mode."
+        if mode == 'word':
+            return self.entries.get(word, set())
+        words = self.vocabulary.expand(word, mode)
+        return set().union(*(self.entries[w] for w in words))
+
+    def search(self, query: str, mode: str = 'word') -> set[Char]:
         if words := list(tokenize(query)):
-            found = self.entries[words[0]]
-            return found.intersection(*(self.entries[w] for w in words[1:]))
+            entries = sorted((self.lookup(w, mode) for w in words), key=len)
+            return entries[0].intersection(*entries[1:])
+        else:
+            return set()
+
+
+GALLOP_RATIO = 16  # gallop over postings this many times longer than candidates
+
+
+def gallop(codes: Sequence[int], target: int, lo: int) -> int:
+    """Find the first index from lo where codes[index] >= target,
+    probing 1, 2, 4, 8... items ahead before a binary search."""
+    hi = lo
+    step = 1
+    while hi < len(codes) and codes[hi] < target:
+        lo = hi + 1
+        hi += step
+        step *= 2
+    return bisect.bisect_left(codes, target, lo, min(hi, len(codes)))
+
+
+def intersect(postings: list[Sequence[int]]) -> list[int]:
+    """Code points present in all the sorted postings. Start with the
+    shortest, and look up the remaining candidates in each longer one::
+
+        >>> intersect([[1, 3, 5, 7, 9, 11, 13], [3, 4, 5], [3, 5, 9]])
+        [3, 5]
+    """
+    postings = sorted(postings, key=len)
+    found = list(postings[0])
+    for codes in postings[1:]:
+        if not found:
+            break
+        if len(codes) < len(found) * GALLOP_RATIO:  # a C loop over codes wins
+            found = sorted(set(found).intersection(codes))
+            continue
+        candidates, found = found, []
+        i = 0
+        for code in candidates:
+            i = gallop(codes, code, i)
+            if i == len(codes):
+                break
+            if codes[i] == code:
+                found.append(code)
+    return found
+
+
+def merge(postings: Iterable[Sequence[int]]) -> Sequence[int]:
+    "Sorted code points in any of the sorted postings."
+    postings = list(postings)
+    if len(postings) == 1:
+        return postings[0]
+    return sorted(set().union(*postings))
+
+
+class PostingIndex(RankingMixin, ABC):
+    "Index storing the code points for each word in a sorted array."
+
+    vocabulary: Vocabulary
+
+    @abstractmethod
+    def code_points(self, word: str) -> Sequence[int]:
+        "Sorted code points of the characters with word in their names."
+
+    def posting_size(self, word: str) -> int:
+        return len(self.code_points(word))
+
+    def lookup(self, word: str, mode: str = 'word') -> Sequence[int]:
+        "Sorted code points for word, matched according to mode."
+        if mode == 'word':
+            return self.code_points(word)
+        words = self.vocabulary.expand(word, mode)
+        return merge(self.code_points(w) for w in words)
+
+    def search(self, query: str, mode: str = 'word') -> set[Char]:
+        if postings := [self.lookup(w, mode) for w in tokenize(query)]:
+            return set(map(chr, intersect(postings)))
         else:
             return set()
 
 
+class CompactIndex(PostingIndex, UpdateMixin):
+    """Index keeping an ``array('I')`` of code points per word,
+    instead of a set of characters::
+
+        >>> idx = CompactIndex(32, 128)
+        >>> idx.entries['DOLLAR']
+        array('I', [36])
+        >>> idx.search('capital a')
+        {'A'}
+    """
+
+    entries: dict[str, array]
+
+    def __init__(self, start: int = 32, stop: int = STOP_CODE):
+        codes_by_word: defaultdict[str, list[int]] = defaultdict(list)
+        for code in range(start, stop):
+            name = unicodedata.name(chr(code), '')
+            for word in name.replace('-', ' ').split():  # already uppercase
+                codes = codes_by_word[word]
+                if not codes or codes[-1] != code:  # same word twice in a name
+                    codes.append(code)
+        self.entries = {word: array('I', codes)
+                        for word, codes in codes_by_word.items()}
+
+    @cached_property
+    def vocabulary(self) -> Vocabulary:
+        return Vocabulary(sorted(self.entries))
+
+    def __getstate__(self) -> dict[str, bytes]:
+        # much faster to pickle than array objects, for build_index
+        return {word: codes.tobytes() for word, codes in self.entries.items()}
+
+    def __setstate__(self, state: dict[str, bytes]) -> None:
+        self.entries = {}
+        for word, data in state.items():
+            self.entries[word] = codes = array('I')
+            codes.frombytes(data)
+
+    def update(self, other: 'CompactIndex') -> None:
+        """Append the entries of other, built for a range of code points
+        after those in this index, so the arrays stay sorted."""
+        for word, codes in other.entries.items():
+            if word in self.entries:
+                self.entries[word].extend(codes)
+            else:
+                self.entries[word] = codes
+
+    @classmethod
+    def from_mapped(cls, mapped: 'MappedIndex') -> 'CompactIndex':
+        "Copy a mapped index to memory, to update it."
+        index = cls(0, 0)  # empty
+        index.entries = {word: array('I', codes) for word, codes in mapped.items()}
+        return index
+
+    def add_code(self, word: str, code: int) -> None:
+        codes = self.entries.setdefault(word, array('I'))
+        i = bisect.bisect_left(codes, code)
+        if i == len(codes) or codes[i] != code:
+            codes.insert(i, code)
+
+    def remove_code(self, word: str, code: int) -> None:
+        codes = self.entries.get(word, array('I'))
+        i = bisect.bisect_left(codes, code)
+        if i < len(codes) and codes[i] == code:
+            del codes[i]
+            if not codes:
+                del self.entries[word]
+
+    def code_points(self, word: str) -> Sequence[int]:
+        return self.entries.get(word, ())
+
+
+def build_index(workers: int | None = None,
+                start: int = 32, stop: int = STOP_CODE) -> CompactIndex:
+    """Build a ``CompactIndex`` with worker processes, each indexing
+    chunks of the code range, and merge their posting lists::
+
+        >>> build_index(2, 32, 128).entries == CompactIndex(32, 128).entries
+        True
+
+    By default, use one worker per CPU.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return CompactIndex(start, stop)
+    step = -(-(stop - start) // (workers * CHUNKS_PER_WORKER))  # ceiling
+    starts = range(start, stop, step)
+    stops = [min(chunk_start + step, stop) for chunk_start in starts]
+    index = CompactIndex(start, start)  # empty
+    with ProcessPoolExecutor(workers) as executor:
+        for part in executor.map(CompactIndex, starts, stops):  # in order
+            index.update(part)
+    return index
+
+
+class CharIndex(Protocol):
+    def search(self, query: str, mode: str = 'word') -> set[Char]: ...
+
+    def search_page(self, query: str, mode: str = 'word', offset: int = 0,
+                    limit: int = PAGE_SIZE) -> Page: ...
+
+    def posting_size(self, word: str) -> int: ...
+
+
+def index_path(directory: str | Path = INDEX_DIR) -> Path:
+    return Path(directory) / f'charindex-{unicodedata.unidata_version}.idx'
+
+
+def save_index(index: InvertedIndex | CompactIndex, path: str | Path) -> None:
+    """Write index to path in this layout, after a header:
+    word end offsets, posting end offsets, UTF-8 words padded to
+    a multiple of 4 bytes, and the code points of each word, sorted.
+    All numbers are unsigned 32-bit integers."""
+    word_ends = array('I')
+    posting_ends = array('I')
+    words = bytearray()
+    postings = array('I')
+    for word in sorted(index.entries):
+        if codes := index.code_points(word):
+            words += word.encode()
+            word_ends.append(len(words))
+            postings.extend(codes)
+            posting_ends.append(len(postings))
+    words += bytes(-len(words) % postings.itemsize)
+    header = INDEX_HEADER.pack(INDEX_MAGIC, INDEX_FORMAT,
+                               unicodedata.unidata_version.encode(),
+                               len(word_ends), len(postings))
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(temp_path, 'wb') as fp:
+            fp.write(header)
+            word_ends.tofile(fp)
+            posting_ends.tofile(fp)
+            fp.write(words)
+            postings.tofile(fp)
+        os.replace(temp_path, path)  # readers never see a partial file
+    except OSError:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+
+
+class WordTable:
+    "Sequence of the sorted words in a mapped index."
+
+    def __init__(self, words: memoryview, word_ends: memoryview):
+        self.words = words
+        self.word_ends = word_ends
+
+    def __len__(self) -> int:
+        return len(self.word_ends)
+
+    def __getitem__(self, i: int) -> str:
+        start = self.word_ends[i - 1] if i else 0
+        return str(self.words[start:self.word_ends[i]], 'utf-8')
+
+
+class MappedIndex(PostingIndex):
+    "Read-only index searching a file written by ``save_index``."
+
+    def __init__(self, path: str | Path):
+        with open(path, 'rb') as fp:
+            self.map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, file_format, version, word_count, posting_count = (
+                INDEX_HEADER.unpack_from(self.map))
+        except struct.error:
+            raise ValueError(f'{path} is too short for an index header') from None
+        if magic != INDEX_MAGIC or file_format != INDEX_FORMAT:
+            raise ValueError(f'{path} is not a character index file')
+        self.unidata_version = version.rstrip(b'\0').decode(errors='replace')
+        view = memoryview(self.map)
+        offset = INDEX_HEADER.size
+        size = word_count * 4
+        if len(view) < offset + 2 * size:
+            raise ValueError(f'{path} is truncated')
+        word_ends = view[offset:offset + size].cast('I')
+        offset += size
+        self.posting_ends = view[offset:offset + size].cast('I')
+        offset += size
+        size = word_ends[-1] + -word_ends[-1] % 4 if word_count else 0
+        if len(view) != offset + size + posting_count * 4 or (
+                word_count and self.posting_ends[-1] != posting_count):
+            raise ValueError(f'{path} size does not match its header')
+        self.words = WordTable(view[offset:offset + size], word_ends)
+        offset += size
+        self.postings = view[offset:offset + posting_count * 4].cast('I')
+        self.vocabulary = Vocabulary(self.words)  # type: ignore[arg-type]
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def items(self) -> Iterator[tuple[str, memoryview]]:
+        "Yield each word with its code points."
+        start = 0
+        for i, end in enumerate(self.posting_ends):
+            yield self.words[i], self.postings[start:end]
+            start = end
+
+    def code_points(self, word: str) -> memoryview:
+        i = bisect.bisect_left(self.words, word)  # type: ignore[arg-type]
+        if i == len(self.words) or self.words[i] != word:
+            return self.postings[0:0]
+        start = self.posting_ends[i - 1] if i else 0
+        return self.postings[start:self.posting_ends[i]]
+
+
+def load_index(directory: str | Path = INDEX_DIR) -> MappedIndex | CompactIndex:
+    """Map the index for this Unicode version, saving it first if needed.
+    If it cannot be saved, warn and return the index built in memory."""
+    path = index_path(directory)
+    try:
+        index = MappedIndex(path)
+        if index.unidata_version != unicodedata.unidata_version:
+            raise ValueError(f'{path} was built for another Unicode version')
+    except (OSError, ValueError):
+        built = build_index()
+        try:
+            save_index(built, path)
+        except OSError as exc:
+            warnings.warn(f'index not saved, using it from memory: {exc}')
+            return built
+        index = MappedIndex(path)
+    return index
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+def query_key(query: str, mode: str = 'word') -> tuple[str, ...]:
+    "Normalized query: the search mode and the sorted, unique words."
+    return (mode, *sorted(set(tokenize(query))))
+
+
+class QueryCache:
+    """Responses for the most recently used queries, up to maxsize,
+    usually ready to send as encoded bytes.
+    If ttl is given, responses older than ttl seconds are not used::
+
+        >>> now = 0.0
+        >>> cache = QueryCache(maxsize=1, ttl=60, clock=lambda: now)
+        >>> cache.put(('word', 'CAT'), b'cat')
+        >>> now = 59.0
+        >>> cache.get(('word', 'CAT'))
+        b'cat'
+        >>> now = 60.0
+        >>> cache.get(('word', 'CAT')) is None
+        True
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.responses: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Any:
+        "Return the response saved for key, or None."
+        entry = self.responses.get(key)
+        if entry is not None:
+            saved_at, response = entry
+            if self.ttl is None or self.clock() - saved_at < self.ttl:
+                self.hits += 1
+                self.responses.move_to_end(key)
+                return response
+            del self.responses[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: tuple, response: Any) -> None:
+        self.responses[key] = self.clock(), response
+        self.responses.move_to_end(key)
+        if len(self.responses) > self.maxsize:
+            self.responses.popitem(last=False)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self.responses))
+
+    def clear(self) -> None:
+        self.responses.clear()
+        self.hits = self.misses = 0
+
+
+def update_index(path: str | Path, delta: NameDelta,
+                 aliases: Mapping[Char, str] | None = None,
+                 new_path: str | Path | None = None) -> MappedIndex:
+    """Apply delta and aliases to the index file at path, saving the
+    result to new_path, by default the index file for the Unicode
+    version of the running Python."""
+    index = CompactIndex.from_mapped(MappedIndex(path))
+    index.apply(delta)
+    if aliases:
+        index.add_aliases(aliases)
+    new_path = index_path() if new_path is None else new_path
+    save_index(index, new_path)
+    return MappedIndex(new_path)
+
+
+def read_aliases(lines: Iterable[str]) -> dict[Char, str]:
+    """Read aliases from lines with a character, a tab and its alias.
+    Aliases of the same character are joined."""
+    aliases: dict[Char, str] = {}
+    for line in lines:
+        char, tab, alias = line.rstrip('\n').partition('\t')
+        if tab and len(char) == 1:
+            aliases[char] = f'{aliases[char]} {alias}' if char in aliases else alias
+    return aliases
+
+
+def format_line(char: Char) -> str:
+    name = unicodedata.name(char, '')
+    code = ord(char)
+    return f'U+{code:04X}\t{char}\t{name}'
+
+
 def format_results(chars: set[Char]) -> Iterator[str]:
     for char in sorted(chars):
-        name = unicodedata.name(char)
-        code = ord(char)
-        yield f'U+{code:04X}\t{char}\t{name}'
+        yield format_line(char)
 
 
 def main(words: list[str]) -> None:
     if not words:
         print('Please give one or more words to search.')
         sys.exit(2)  # command line usage error
-    index = InvertedIndex()
+    index = load_index()
     chars = index.search(' '.join(words))
     for line in format_results(chars):
         print(line)
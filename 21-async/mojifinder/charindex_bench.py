@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+
+"""
+Time building the character index with different numbers of workers.
+
+Usage: python3 charindex_bench.py [workers...]
+"""
+
+import os
+import sys
+import time
+
+from charindex import build_index
+
+
+def main(args: list[str]) -> None:
+    cpus = os.cpu_count() or 1
+    counts = [int(arg) for arg in args] or sorted({1, 2, 4, cpus})
+    print(f'{cpus} CPUs')
+    baseline = None
+    for workers in counts:
+        t0 = time.perf_counter()
+        index = build_index(workers)
+        elapsed = time.perf_counter() - t0
+        baseline = baseline or elapsed
+        print(f'{workers:3d} workers: {elapsed:6.2f}s  '
+              f'{baseline / elapsed:5.2f}x  {len(index.entries):,} words')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,21 +1,51 @@
 #!/usr/bin/env python3
 
 # tag::TCP_MOJIFINDER_TOP[]
+import argparse
 import asyncio
+import contextlib
 import functools
+import multiprocessing
+import os
+import socket
+import statistics
 import sys
+import time
 from asyncio.trsock import TransportSocket
-from typing import cast
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import NamedTuple, cast
 
-from charindex import InvertedIndex, format_results  # <1>
+from charindex import (CharIndex, QueryCache, load_index,  # <1>
+                       format_line, query_key, tokenize, PAGE_SIZE)
 
 CRLF = b'\r\n'
 PROMPT = b'?> '
+MODE_COMMANDS = {'/prefix': 'prefix', '/fuzzy': 'fuzzy'}
+HIGH_WATER = 16 * 1024  # bytes buffered per connection before waiting
+BATCH_COMMAND = '/batch'
 
-async def finder(index: InvertedIndex,          # <2>
+HEAVY_QUERY_COST = 2000  # estimated postings to rank; about 5 ms of work
+MAX_HEAVY_PER_CLIENT = 2  # heavy queries running at once per client host
+HEAVY_QUERY_TIMEOUT = 10.0  # seconds
+TOO_BUSY = b'Too many large queries in progress, try again later.' + CRLF
+TIMED_OUT = b'Query timed out, try more specific words.' + CRLF
+BAD_TAG = b'Tags must be printable characters.' + CRLF
+
+cache = QueryCache()
+executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='search')
+heavy_by_client: Counter[str] = Counter()
+latencies: dict[str, deque[float]] = {
+    'cached': deque(maxlen=10_000),
+    'fast': deque(maxlen=10_000),
+    'slow': deque(maxlen=10_000),
+}
+
+async def finder(index: CharIndex,              # <2>
                  reader: asyncio.StreamReader,
                  writer: asyncio.StreamWriter) -> None:
     client = writer.get_extra_info('peername')  # <3>
+    out = ResponseWriter(writer)
     while True:  # <4>
         writer.write(PROMPT)  # can't await!  # <5>
         await writer.drain()  # must await!  # <6>
@@ -30,7 +60,12 @@ async def finder(index: InvertedIndex,          # <2>
         if query:
             if ord(query[:1]) < 32:  # <12>
                 break
-            results = await search(query, index, writer)  # <13>
+            if query == BATCH_COMMAND:
+                queries = await batch(index, reader, out)
+                print(f'   To {client}: {queries} batch responses.')
+                break
+            words, mode, page = parse_query(query)
+            results = await search(words, index, out, mode, page)  # <13>
             print(f'   To {client}: {results} results.')  # <14>
 
     writer.close()  # <15>
@@ -38,41 +73,244 @@ async def finder(index: InvertedIndex,          # <2>
     print(f'Close {client}.')  # <17>
 # end::TCP_MOJIFINDER_TOP[]
 
+class ResponseWriter:
+    """Send data to a client through a bytearray reused for the whole
+    connection, writing it to the transport at the high-water mark.
+    Each write awaits drain(), so a slow client makes the server wait,
+    instead of making it hold a large response in the transport buffer."""
+
+    def __init__(self, writer: asyncio.StreamWriter, high_water: int = HIGH_WATER):
+        self.writer = writer
+        self.high_water = high_water
+        self.buffer = bytearray()
+        writer.transport.set_write_buffer_limits(high=high_water)
+
+    @property
+    def client(self) -> str:
+        return self.writer.get_extra_info('peername')[0]
+
+    async def write(self, data: bytes) -> None:
+        view = memoryview(data)
+        while view:
+            room = self.high_water - len(self.buffer)
+            self.buffer += view[:room]
+            view = view[room:]
+            if len(self.buffer) >= self.high_water:
+                await self.flush()
+
+    async def flush(self) -> None:
+        if self.buffer:
+            self.writer.write(bytes(self.buffer))  # transports may keep it
+            self.buffer.clear()
+        await self.writer.drain()
+
+class Query(NamedTuple):
+    words: str
+    mode: str = 'word'
+    page: int = 1
+
+def parse_query(query: str) -> Query:
+    """Split leading commands from the query words: /prefix or /fuzzy
+    set the search mode, and /page N selects a page of results."""
+    mode, page = 'word', 1
+    words = query.split()
+    while words:
+        if words[0] in MODE_COMMANDS:
+            mode = MODE_COMMANDS[words.pop(0)]
+        elif words[0] == '/page' and words[1:2] and words[1].isdigit():
+            page = max(int(words[1]), 1)
+            del words[:2]
+        else:
+            break
+    return Query(' '.join(words), mode, page)
+
 # tag::TCP_MOJIFINDER_SEARCH[]
 async def search(query: str,  # <1>
-                 index: InvertedIndex,
-                 writer: asyncio.StreamWriter) -> int:
-    chars = index.search(query)  # <2>
-    lines = (line.encode() + CRLF for line  # <3>
-                in format_results(chars))
-    writer.writelines(lines)  # <4>
-    await writer.drain()      # <5>
-    status_line = f'{"─" * 66} {len(chars)} found'  # <6>
-    writer.write(status_line.encode() + CRLF)
-    await writer.drain()
-    return len(chars)
+                 index: CharIndex,
+                 writer: ResponseWriter,
+                 mode: str = 'word',
+                 page: int = 1) -> int:
+    response = await respond(query, index, writer.client, mode, page)  # <2>
+    await writer.write(response)  # <3>
+    await writer.flush()          # <4>
+    return response.count(CRLF) - 1
+
+async def respond(query: str, index: CharIndex, client: str,
+                  mode: str = 'word', page: int = 1) -> bytes:
+    start = time.perf_counter()
+    key = (*query_key(query, mode), page)
+    if (response := cache.get(key)) is not None:
+        path = 'cached'
+    elif estimate_cost(index, query, mode) < HEAVY_QUERY_COST:
+        path = 'fast'
+        response = render_query(index, query, mode, page)
+        cache.put(key, response)
+    else:
+        path = 'slow'
+        response = await offload(client, index, query, mode, page)
+        if response not in (TOO_BUSY, TIMED_OUT):
+            cache.put(key, response)
+    latencies[path].append(time.perf_counter() - start)
+    return response
+
+def render_query(index: CharIndex, query: str, mode: str, page: int) -> bytes:
+    offset = (page - 1) * PAGE_SIZE
+    chars, total = index.search_page(query, mode, offset)
+    return render(chars, total, offset)
+
+def render(chars: list[str], total: int, offset: int = 0) -> bytes:
+    lines = [format_line(char).encode() + CRLF  # <5>
+                for char in chars]
+    status_line = f'{"─" * 66} {total} found'  # <6>
+    if offset >= total > 0:
+        status_line += ', none on this page'
+    elif len(chars) < total:
+        status_line += f', showing {offset + 1}-{offset + len(chars)}'
+        if offset + len(chars) < total:
+            status_line += f'; /page {offset // PAGE_SIZE + 2} for more'
+    lines.append(status_line.encode() + CRLF)
+    return b''.join(lines)
 # end::TCP_MOJIFINDER_SEARCH[]
 
+async def batch(index: CharIndex, reader: asyncio.StreamReader,
+                writer: ResponseWriter) -> int:
+    """Answer queries with no prompts, until the client stops sending.
+    Clients may send many queries without waiting for responses, one
+    per line, each optionally preceded by a tag and a tab; the default
+    tag is the query's line number in the batch. Every response comes
+    after a line with its length in bytes, a space, and its tag. A tag
+    with control characters gets an error response under the default tag."""
+    count = 0
+    while data := await reader.readline():
+        count += 1
+        line = data.decode(errors='replace').strip()
+        tag, tab, query = line.partition('\t')
+        if not tab:
+            tag, query = str(count), line
+        if tag.isprintable():
+            words, mode, page = parse_query(query)
+            response = await respond(words, index, writer.client, mode, page)
+        else:
+            tag, response = str(count), BAD_TAG
+        await writer.write(f'{len(response)} {tag}'.encode() + CRLF)
+        await writer.write(response)
+        await writer.flush()
+    return count
+
+def estimate_cost(index: CharIndex, query: str, mode: str) -> float:
+    """Estimate the work for a query by the size of its shortest posting
+    list, which bounds both the intersection and the ranking. Prefix and
+    fuzzy queries must expand their words before any posting list is
+    known, so they are always considered heavy."""
+    if mode != 'word':
+        return float('inf')
+    return min((index.posting_size(w) for w in tokenize(query)), default=0)
+
+async def offload(client: str, index: CharIndex,
+                  query: str, mode: str, page: int) -> bytes:
+    """Run a heavy query in the executor, so the event loop keeps serving
+    other clients, unless this client already has too many running."""
+    if heavy_by_client[client] >= MAX_HEAVY_PER_CLIENT:
+        return TOO_BUSY
+    heavy_by_client[client] += 1
+    loop = asyncio.get_running_loop()
+    future = executor.submit(render_query, index, query, mode, page)
+    # a query that timed out keeps its thread busy until it ends,
+    # so it counts against its client until then
+    def done(_: Future) -> None:
+        with contextlib.suppress(RuntimeError):  # the loop closed
+            loop.call_soon_threadsafe(release_heavy, client)
+    future.add_done_callback(done)
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future),
+                                      HEAVY_QUERY_TIMEOUT)
+    except asyncio.TimeoutError:
+        return TIMED_OUT
+
+def release_heavy(client: str) -> None:
+    heavy_by_client[client] -= 1
+    if not heavy_by_client[client]:
+        del heavy_by_client[client]
+
+def latency_report() -> str:
+    lines = []
+    for path, samples in latencies.items():
+        if len(samples) > 1:
+            cuts = statistics.quantiles(samples, n=100)
+            lines.append(f'{path:>6}: {len(samples):6d} queries, '
+                         f'p50 {cuts[49] * 1000:7.2f} ms, '
+                         f'p99 {cuts[98] * 1000:7.2f} ms')
+    return '\n'.join(lines)
+
 # tag::TCP_MOJIFINDER_MAIN[]
-async def supervisor(index: InvertedIndex, host: str, port: int) -> None:
+async def supervisor(index: CharIndex, host: str, port: int,
+                     reuse_port: bool = False) -> None:
     server = await asyncio.start_server(    # <1>
         functools.partial(finder, index),   # <2>
-        host, port)                         # <3>
+        host, port, reuse_port=reuse_port)  # <3>
 
     socket_list = cast(tuple[TransportSocket, ...], server.sockets)  # <4>
     addr = socket_list[0].getsockname()
     print(f'Serving on {addr}. Hit CTRL-C to stop.')  # <5>
     await server.serve_forever()  # <6>
 
-def main(host: str = '127.0.0.1', port_arg: str = '2323'):
+def main(host: str = '127.0.0.1', port_arg: str = '2323', workers: int = 1):
     port = int(port_arg)
-    print('Building index.')
-    index = InvertedIndex()                         # <7>
+    print('Loading index.')
+    index = load_index()                            # <7>
+    if workers > 1:  # the index file is saved by now, so workers just map it
+        prefork(host, port, workers)
+        return
     try:
         asyncio.run(supervisor(index, host, port))  # <8>
     except KeyboardInterrupt:                       # <9>
         print('\nServer shut down.')
+        print(f'Cache: {cache.cache_info()}, hit rate {cache.hit_rate:.1%}')
+        print(latency_report())
+# end::TCP_MOJIFINDER_MAIN[]
+
+def worker(host: str, port: int) -> None:
+    index = load_index()
+    try:
+        asyncio.run(supervisor(index, host, port, reuse_port=True))
+    except KeyboardInterrupt:
+        print(f'Worker {os.getpid()} shut down. '
+              f'Cache: {cache.cache_info()}, hit rate {cache.hit_rate:.1%}')
+        print(latency_report())
+
+def prefork(host: str, port: int, workers: int) -> None:
+    """Run an event loop in each of workers processes. Each binds its own
+    socket to the same port with SO_REUSEPORT, and the kernel spreads new
+    connections among them. The workers map the same index file, so
+    they share its pages in the OS page cache."""
+    processes = [multiprocessing.Process(target=worker, args=(host, port))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:  # CTRL-C also interrupts the workers
+        for process in processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+        print('\nServer shut down.')
+
+def parse_args(args: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Unicode character search server.')
+    parser.add_argument('host', nargs='?', default='127.0.0.1')
+    parser.add_argument('port', nargs='?', default='2323')
+    parser.add_argument(
+        '-w', '--workers', metavar='N', type=int, default=1,
+        help='number of server processes (default=1)')
+    parsed = parser.parse_args(args)
+    if parsed.workers < 1:
+        parser.error('--workers must be at least 1')
+    if parsed.workers > 1 and not hasattr(socket, 'SO_REUSEPORT'):
+        parser.error('--workers needs SO_REUSEPORT, not available here')
+    return parsed
 
 if __name__ == '__main__':
-    main(*sys.argv[1:])
-# end::TCP_MOJIFINDER_MAIN[]
+    args = parse_args(sys.argv[1:])
+    main(args.host, args.port, args.workers)
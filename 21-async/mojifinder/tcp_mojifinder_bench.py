@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+"""
+Compare queries per second with the interactive and the batch protocols
+of tcp_mojifinder.py, over one connection to a server started here.
+Queries are random words from the index, most of them cache misses.
+
+Usage: python3 tcp_mojifinder_bench.py [queries]
+"""
+
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from tcp_mojifinder import BATCH_COMMAND, CRLF, PROMPT
+from tcp_mojifinder_load import HOST, PORT, sample_words, wait_for_server
+
+
+async def interactive(queries: list[str]) -> None:
+    reader, writer = await asyncio.open_connection(HOST, PORT)
+    await reader.readuntil(PROMPT)
+    for query in queries:
+        writer.write(query.encode() + CRLF)
+        await reader.readuntil(PROMPT)
+    writer.close()
+    await writer.wait_closed()
+
+
+async def send_all(writer: asyncio.StreamWriter, queries: list[str]) -> None:
+    writer.write(BATCH_COMMAND.encode() + CRLF)
+    for tag, query in enumerate(queries):
+        writer.write(f'{tag}\t{query}'.encode() + CRLF)
+        await writer.drain()
+    writer.write_eof()
+
+
+async def pipelined(queries: list[str]) -> None:
+    reader, writer = await asyncio.open_connection(HOST, PORT)
+    await reader.readuntil(PROMPT)
+    sender = asyncio.create_task(send_all(writer, queries))
+    for expected in range(len(queries)):
+        size, tag = (await reader.readline()).split(maxsplit=1)
+        assert int(tag) == expected
+        await reader.readexactly(int(size))
+    await sender
+    writer.close()
+    await writer.wait_closed()
+
+
+def main(count: int) -> None:
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    queries = (sample_words() * (count // 5000 + 1))[:count]
+    for label, client in [('interactive', interactive), ('batch', pipelined)]:
+        server = subprocess.Popen(
+            [sys.executable, 'tcp_mojifinder.py', HOST, str(PORT)],
+            stdout=subprocess.DEVNULL, start_new_session=True)
+        try:
+            wait_for_server()
+            t0 = time.perf_counter()
+            asyncio.run(client(queries))
+            elapsed = time.perf_counter() - t0
+            time.sleep(0.2)  # let the server close the connection
+        finally:
+            os.killpg(server.pid, signal.SIGINT)
+            server.wait()
+        print(f'{label:>12}: {count / elapsed:9.1f} queries/s')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
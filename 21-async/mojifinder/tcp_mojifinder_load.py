@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+"""
+Load test for tcp_mojifinder.py: start the server with each number of
+workers, keep it busy with concurrent clients, and report queries per
+second. Clients run in several processes, so the load generator is not
+the bottleneck. Queries are random words from the index, so most of
+them miss the query cache and the server does the searching.
+
+Usage: python3 tcp_mojifinder_load.py [--workers 1 2 4] [--clients 32]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from charindex import load_index
+from tcp_mojifinder import PROMPT
+
+HOST = '127.0.0.1'
+PORT = 2424
+
+
+def sample_words(size: int = 5000, seed: int = 0) -> list[str]:
+    "Random words from the index, excluding hex numbers and other codes."
+    index = load_index()
+    words = [index.words[i] for i in range(len(index.words))]
+    words = [word for word in words if word.isalpha()]
+    return random.Random(seed).sample(words, min(size, len(words)))
+
+
+async def client(words: list[str], deadline: float) -> int:
+    reader, writer = await asyncio.open_connection(HOST, PORT)
+    await reader.readuntil(PROMPT)
+    queries = 0
+    while time.perf_counter() < deadline:
+        writer.write(random.choice(words).encode() + b'\r\n')
+        await reader.readuntil(PROMPT)
+        queries += 1
+    writer.close()
+    await writer.wait_closed()
+    return queries
+
+
+async def run_clients(clients: int, seconds: float, words: list[str]) -> int:
+    deadline = time.perf_counter() + seconds
+    counts = await asyncio.gather(*(client(words, deadline)
+                                    for _ in range(clients)))
+    return sum(counts)
+
+
+def client_process(clients: int, seconds: float, words: list[str]) -> int:
+    return asyncio.run(run_clients(clients, seconds, words))
+
+
+def wait_for_server(timeout: float = 10) -> None:
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            socket.create_connection((HOST, PORT)).close()
+            return
+        except ConnectionRefusedError:
+            if time.perf_counter() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def measure(workers: int, clients: int, seconds: float,
+            words: list[str]) -> float:
+    "Queries per second served by workers processes."
+    server = subprocess.Popen(
+        [sys.executable, 'tcp_mojifinder.py', HOST, str(PORT),
+         '--workers', str(workers)],
+        stdout=subprocess.DEVNULL, start_new_session=True)
+    try:
+        wait_for_server()
+        time.sleep(0.5)  # let every worker bind its socket
+        processes = min(os.cpu_count() or 1, clients)
+        per_process = [clients // processes + (i < clients % processes)
+                       for i in range(processes)]
+        with ProcessPoolExecutor(processes) as executor:
+            counts = executor.map(client_process, per_process,
+                                  [seconds] * processes,
+                                  [words] * processes)
+            return sum(counts) / seconds
+    finally:
+        os.killpg(server.pid, signal.SIGINT)
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Measure tcp_mojifinder.py throughput by worker count.')
+    parser.add_argument('-w', '--workers', metavar='N', type=int, nargs='+',
+                        default=[1, 2, 4])
+    parser.add_argument('-c', '--clients', metavar='N', type=int, default=32,
+                        help='concurrent connections (default=32)')
+    parser.add_argument('-s', '--seconds', type=float, default=5,
+                        help='duration of each measurement (default=5)')
+    args = parser.parse_args()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    words = sample_words()
+    print(f'{os.cpu_count()} CPUs, {args.clients} clients')
+    baseline = None
+    for workers in args.workers:
+        qps = measure(workers, args.clients, args.seconds, words)
+        baseline = baseline or qps
+        print(f'{workers:3d} workers: {qps:9.1f} queries/s  '
+              f'{qps / baseline:5.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,16 @@
+import json
+from enum import Enum
 from pathlib import Path
 from unicodedata import name
 
-from fastapi import FastAPI
-from fastapi.responses import HTMLResponse
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import HTMLResponse, Response
+from pydantic import BaseModel, Field
 
-from charindex import InvertedIndex
+from charindex import PAGE_SIZE, QueryCache, load_index, query_key
+
+MAX_LIMIT = 1000
+MAX_BATCH = 1000
 
 STATIC_PATH = Path(__file__).parent.absolute() / 'static'  # <1>
 
@@ -18,16 +23,67 @@ class CharName(BaseModel):  # <3>
     char: str
     name: str
 
+class SearchMode(str, Enum):
+    word = 'word'
+    prefix = 'prefix'
+    fuzzy = 'fuzzy'
+
+class BatchQuery(BaseModel):
+    q: str
+    mode: SearchMode = SearchMode.word
+    offset: int = Field(0, ge=0)
+    limit: int = Field(PAGE_SIZE, ge=1, le=MAX_LIMIT)
+
+class BatchResult(BaseModel):
+    q: str
+    total: int
+    results: list[CharName]
+
 def init(app):  # <4>
-    app.state.index = InvertedIndex()
+    app.state.index = load_index()
+    app.state.cache = QueryCache()
     app.state.form = (STATIC_PATH / 'form.html').read_text()
 
 init(app)  # <5>
 
 @app.get('/search', response_model=list[CharName])  # <6>
-async def search(q: str):  # <7>
-    chars = sorted(app.state.index.search(q))
-    return ({'char': c, 'name': name(c)} for c in chars)  # <8>
+async def search(q: str,  # <7>
+                 mode: SearchMode = SearchMode.word,
+                 offset: int = Query(0, ge=0),
+                 limit: int = Query(PAGE_SIZE, ge=1, le=MAX_LIMIT)):
+    total, content = cached_search(q, mode, offset, limit)
+    return Response(content, media_type='application/json',
+                    headers={'X-Total-Count': str(total)})
+
+@app.post('/search/batch', response_model=list[BatchResult])
+async def search_batch(queries: list[BatchQuery]):
+    if len(queries) > MAX_BATCH:
+        raise HTTPException(413, f'At most {MAX_BATCH} queries per batch.')
+    parts = []
+    for query in queries:
+        total, content = cached_search(query.q, query.mode,
+                                       query.offset, query.limit)
+        head = json.dumps({'q': query.q, 'total': total}, ensure_ascii=False)
+        parts.append(head[:-1].encode() + b', "results": ' + content + b'}')
+    return Response(b'[' + b', '.join(parts) + b']',
+                    media_type='application/json')
+
+def cached_search(q: str, mode: SearchMode,
+                  offset: int, limit: int) -> tuple[int, bytes]:
+    "Total results and the JSON for a page of them, from the cache if there."
+    key = (*query_key(q, mode.value), offset, limit)
+    if (cached := app.state.cache.get(key)) is None:
+        chars, total = app.state.index.search_page(q, mode.value, offset, limit)
+        results = [{'char': c, 'name': name(c)} for c in chars]  # <8>
+        content = json.dumps(results, ensure_ascii=False).encode()
+        cached = total, content
+        app.state.cache.put(key, cached)
+    return cached
+
+@app.get('/stats', include_in_schema=False)
+def stats():
+    cache = app.state.cache
+    return {**cache.cache_info()._asdict(), 'hit_rate': cache.hit_rate}
 
 @app.get('/', response_class=HTMLResponse, include_in_schema=False)
 def form():  # <9>
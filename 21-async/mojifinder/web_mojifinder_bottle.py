@@ -3,9 +3,9 @@
 import json
 import unicodedata
 
-from bottle import route, request, run, static_file
+from bottle import HTTPError, response, route, request, run, static_file
 
-from charindex import InvertedIndex
+from charindex import PAGE_SIZE, SEARCH_MODES, load_index
 
 index = {}
 
@@ -17,7 +17,17 @@ def form():
 @route('/search')
 def search():
     query = request.query['q']
-    chars = index.search(query)
+    mode = request.query.get('mode', 'word')
+    if mode not in SEARCH_MODES:
+        raise HTTPError(400, f'unknown search mode: {mode!r}')
+    try:
+        offset = int(request.query.get('offset', 0))
+        limit = int(request.query.get('limit', PAGE_SIZE))
+    except ValueError:
+        raise HTTPError(400, 'offset and limit must be integers')
+    chars, total = index.search_page(query, mode, max(offset, 0),
+                                     min(max(limit, 1), 1000))
+    response.set_header('X-Total-Count', str(total))
     results = []
     for char in chars:
         name = unicodedata.name(char)
@@ -27,7 +37,7 @@ def search():
 
 def main(port):
     global index
-    index = InvertedIndex()
+    index = load_index()
     run(host='localhost', port=port, debug=True)
 
 